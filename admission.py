@@ -0,0 +1,107 @@
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, Request, status
+from .metrics import Counter, registry
+from .settings.base import (
+    ADMISSION_ENABLED, ADMISSION_IP_RATE, ADMISSION_IP_BURST, ADMISSION_USERNAME_RATE, ADMISSION_USERNAME_BURST,
+    ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_TRACKED_KEYS,
+)
+
+admission_rejections_total = registry.register(Counter(
+    "admission_rejections_total", "Requests shed by admission control by route and reason.", ("route", "reason")
+))
+
+
+class TokenBuckets:
+    """One token bucket per key, refilled at `rate` tokens a second up to `burst`.
+
+    Only the `maxsize` most recently used keys are tracked; an evicted key starts over full.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    def _tokens(self, key, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def wait_time(self, key, now: float) -> float:
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key, now: float):
+        self._buckets[key] = (self._tokens(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class AdmissionController:
+    """Sheds CPU-heavy requests before they reach bcrypt.
+
+    A request is admitted when fewer than `max_concurrent` admitted requests are running and
+    both its client IP and username buckets for the route still hold a token. Otherwise it
+    gets 429 with Retry-After, so a burst of logins cannot starve the rest of the API.
+    """
+
+    def __init__(self, ip_rate: float, ip_burst: int, username_rate: float, username_burst: int,
+                 max_concurrent: int, max_tracked_keys: int, enabled: bool = True):
+        self.by_ip = TokenBuckets(ip_rate, ip_burst, max_tracked_keys)
+        self.by_username = TokenBuckets(username_rate, username_burst, max_tracked_keys)
+        self.max_concurrent = max_concurrent
+        self.enabled = enabled
+        self.in_flight = 0
+
+    def _reject(self, route: str, reason: str, retry_after: float):
+        admission_rejections_total.inc((route, reason))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    @asynccontextmanager
+    async def admit(self, route: str, client_ip: str, username: str | None = None):
+        if not self.enabled:
+            yield
+            return
+        if self.in_flight >= self.max_concurrent:
+            self._reject(route, "concurrency", 1)
+        now = time.monotonic()
+        ip_key = (route, client_ip)
+        username_key = (route, username.strip().lower()) if username else None
+        if (wait := self.by_ip.wait_time(ip_key, now)) > 0:
+            self._reject(route, "client_ip", wait)
+        if username_key and (wait := self.by_username.wait_time(username_key, now)) > 0:
+            self._reject(route, "username", wait)
+        self.by_ip.take(ip_key, now)
+        if username_key:
+            self.by_username.take(username_key, now)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def clear(self):
+        self.by_ip.clear()
+        self.by_username.clear()
+
+
+def client_ip(request: Request) -> str:
+    # the peer address; deployments behind a proxy need it to set the client from X-Forwarded-For
+    return request.client.host if request.client else "unknown"
+
+
+admission = AdmissionController(
+    ADMISSION_IP_RATE, ADMISSION_IP_BURST, ADMISSION_USERNAME_RATE, ADMISSION_USERNAME_BURST,
+    ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_TRACKED_KEYS, enabled=ADMISSION_ENABLED,
+)
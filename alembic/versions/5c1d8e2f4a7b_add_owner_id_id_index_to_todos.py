@@ -0,0 +1,28 @@
+"""add composite (owner_id, id) index to todos
+
+Revision ID: 5c1d8e2f4a7b
+Revises: d8e59b030a49
+Create Date: 2026-10-18 09:12:04.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d8e2f4a7b'
+down_revision: Union[str, Sequence[str], None] = 'd8e59b030a49'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_todos_owner_id_id', 'todos', ['owner_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todos_owner_id_id', table_name='todos')
@@ -0,0 +1,38 @@
+"""add todo filter, sort and fulltext indexes
+
+Revision ID: 9a4e7b3c2d18
+Revises: 5c1d8e2f4a7b
+Create Date: 2026-10-18 11:40:27.093816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e7b3c2d18'
+down_revision: Union[str, Sequence[str], None] = '5c1d8e2f4a7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_todos_owner_id_completed', 'todos', ['owner_id', 'completed'], unique=False)
+    op.create_index('ix_todos_owner_id_priority', 'todos', ['owner_id', 'priority'], unique=False)
+    op.create_index('ix_todos_owner_id_created_at', 'todos', ['owner_id', 'created_at'], unique=False)
+    op.create_index('ix_todos_owner_id_updated_at', 'todos', ['owner_id', 'updated_at'], unique=False)
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_todos_title_description_fulltext', 'todos', ['title', 'description'], unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_todos_title_description_fulltext', table_name='todos')
+    op.drop_index('ix_todos_owner_id_updated_at', table_name='todos')
+    op.drop_index('ix_todos_owner_id_created_at', table_name='todos')
+    op.drop_index('ix_todos_owner_id_priority', table_name='todos')
+    op.drop_index('ix_todos_owner_id_completed', table_name='todos')
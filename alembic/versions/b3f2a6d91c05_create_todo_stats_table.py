@@ -0,0 +1,41 @@
+"""create todo_stats counter table
+
+Revision ID: b3f2a6d91c05
+Revises: 9a4e7b3c2d18
+Create Date: 2026-10-18 13:05:51.662417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f2a6d91c05'
+down_revision: Union[str, Sequence[str], None] = '9a4e7b3c2d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('todo_stats',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('open_count', sa.Integer(), nullable=False),
+    sa.Column('completed_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'priority')
+    )
+    op.execute(
+        "INSERT INTO todo_stats (owner_id, priority, open_count, completed_count) "
+        "SELECT owner_id, priority, "
+        "SUM(CASE WHEN completed THEN 0 ELSE 1 END), SUM(CASE WHEN completed THEN 1 ELSE 0 END) "
+        "FROM todos GROUP BY owner_id, priority"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('todo_stats')
@@ -0,0 +1,37 @@
+"""create todo_deletions log for delta sync
+
+Revision ID: c7a1f3e9b2d4
+Revises: b3f2a6d91c05
+Create Date: 2026-10-18 16:42:10.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a1f3e9b2d4'
+down_revision: Union[str, Sequence[str], None] = 'b3f2a6d91c05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('todo_deletions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('todo_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_todo_deletions_owner_id_deleted_at', 'todo_deletions', ['owner_id', 'deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_deletions_owner_id_deleted_at', table_name='todo_deletions')
+    op.drop_table('todo_deletions')
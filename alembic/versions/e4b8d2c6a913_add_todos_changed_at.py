@@ -0,0 +1,35 @@
+"""add server-stamped todos.changed_at for delta sync
+
+Revision ID: e4b8d2c6a913
+Revises: c7a1f3e9b2d4
+Create Date: 2026-10-18 18:20:37.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b8d2c6a913'
+down_revision: Union[str, Sequence[str], None] = 'c7a1f3e9b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANGED_AT = sa.DateTime(timezone=True).with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('todos', sa.Column('changed_at', CHANGED_AT, nullable=True))
+    op.execute("UPDATE todos SET changed_at = COALESCE(updated_at, created_at, CURRENT_TIMESTAMP)")
+    op.alter_column('todos', 'changed_at', existing_type=CHANGED_AT, nullable=False)
+    op.create_index('ix_todos_owner_id_changed_at', 'todos', ['owner_id', 'changed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todos_owner_id_changed_at', table_name='todos')
+    op.drop_column('todos', 'changed_at')
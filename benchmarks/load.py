@@ -0,0 +1,286 @@
+"""Drive every API route at a fixed concurrency and report throughput and latency percentiles.
+
+GET /todos/events is left out: its stream stays open until the client goes away, so it has no
+response latency to measure.
+
+The benchmark seeds its own database, runs the app in-process through httpx's ASGI
+transport and writes the results as JSON. Pass --baseline to compare against an earlier
+run; the exit status is 1 when any route regressed beyond --threshold.
+
+Run from the directory that contains the package:
+
+    python -m fastapi_todo_list.benchmarks.load --output bench.json
+    python -m fastapi_todo_list.benchmarks.load --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from ..admission import admission
+from ..database_conn import Base, get_db, get_session_factory
+from ..health import health_monitor
+from ..main import app
+from ..models import Todos, User
+from ..password_hashing import bcrypt_context
+from ..replicas import get_read_db
+from ..routers.auth import create_access_token
+from ..todo_changes import encode_cursor
+from ..todo_stats import rebuild_todo_stats
+
+# routes with no scenario; see the module docstring
+UNMEASURED_ROUTES = {"GET /todos/events"}
+SYNC_DRIVERS = {"sqlite+aiosqlite": "sqlite", "mysql+aiomysql": "mysql+pymysql"}
+BENCH_PASSWORD = "benchmark-password"
+TODO_BODY = {
+    "title": "Benchmark todo",
+    "description": "Created by the load benchmark",
+    "priority": 2,
+    "completed": False,
+    "created_at": "2024-01-01T00:00:00",
+    "updated_at": "2024-01-01T00:00:00",
+}
+
+
+def reserve_size(args) -> int:
+    # every request, warm-up included, may consume one seeded row
+    return args.requests + args.concurrency
+
+
+def seed(database_url: str, users: int, todos_per_user: int, reserve: int):
+    """Create a fresh schema with extra users and todos reserved for the delete routes."""
+    spare = 2 * reserve
+    url = make_url(database_url)
+    sync_url = url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+    if sync_url.get_backend_name() == "sqlite" and sync_url.database and os.path.exists(sync_url.database):
+        os.remove(sync_url.database)
+    engine = create_engine(sync_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    hashed_password = bcrypt_context.hash(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {
+                "id": user_id,
+                "username": f"bench{user_id}",
+                "first_name": "Bench",
+                "last_name": "User",
+                "email": f"bench{user_id}@example.com",
+                "hashed_password": hashed_password,
+                "role": "user",
+                "is_active": True,
+            }
+            for user_id in range(1, users + reserve + 1)
+        ])
+        rows = [
+            {
+                "title": f"Todo {index}",
+                "description": f"Seeded todo {index} for user {owner_id}",
+                "priority": index % 5,
+                "completed": index % 3 == 0,
+                "owner_id": owner_id,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for owner_id in range(1, users + 1)
+            for index in range(todos_per_user + spare)
+        ]
+        for start in range(0, len(rows), 5000):
+            connection.execute(insert(Todos), rows[start:start + 5000])
+    with Session(engine) as db:
+        rebuild_todo_stats(db)
+    engine.dispose()
+
+
+def scenarios(users: int, todos_per_user: int, reserve: int):
+    """Every route in main.app but UNMEASURED_ROUTES, as (name, method, path builder, request kwargs builder).
+
+    Delete routes consume seeded rows, so each one gets its own `reserve` sized slice of them.
+    """
+    spare = 2 * reserve
+    # a delta sync from when the scenarios were built picks up what the write routes changed
+    started_at = datetime.now(timezone.utc)
+    since = encode_cursor((started_at, 0), (started_at, 0), started_at)
+
+    def todo_id(owner_id, i):
+        # seeded ids are laid out owner by owner
+        return (owner_id - 1) * (todos_per_user + spare) + (i % todos_per_user) + 1
+
+    def spare_todo_id(owner_id, i):
+        return (owner_id - 1) * (todos_per_user + spare) + todos_per_user + (i % spare) + 1
+
+    def spare_user_id(i):
+        return users + (i % reserve) + 1
+
+    user_body = lambda i: {
+        "username": f"created{i}-{time.monotonic_ns()}",
+        "first_name": "Created",
+        "last_name": "User",
+        "email": f"created{i}-{time.monotonic_ns()}@example.com",
+        "role": "user",
+        "hashed_password": BENCH_PASSWORD,
+        "is_active": True,
+    }
+    return [
+        ("GET /health_check", "GET", lambda o, i: "/health_check", None),
+        ("GET /health/live", "GET", lambda o, i: "/health/live", None),
+        ("GET /health/ready", "GET", lambda o, i: "/health/ready", None),
+        ("GET /pool_stats", "GET", lambda o, i: "/pool_stats", None),
+        ("GET /token_cache_stats", "GET", lambda o, i: "/token_cache_stats", None),
+        ("GET /metrics", "GET", lambda o, i: "/metrics", None),
+        ("POST /auth/token", "POST", lambda o, i: "/auth/token", lambda o, i: {"data": {"username": f"bench{o}", "password": BENCH_PASSWORD}}),
+        ("GET /users/", "GET", lambda o, i: "/users/", None),
+        ("GET /users/export", "GET", lambda o, i: "/users/export", None),
+        ("GET /users/{user_id}", "GET", lambda o, i: f"/users/{o}", None),
+        ("POST /users/", "POST", lambda o, i: "/users/", lambda o, i: {"json": user_body(i)}),
+        ("PUT /users/{user_id}", "PUT", lambda o, i: f"/users/{spare_user_id(i)}", lambda o, i: {"json": user_body(i)}),
+        ("DELETE /users/{user_id}", "DELETE", lambda o, i: f"/users/{spare_user_id(i)}", None),
+        ("GET /todos/", "GET", lambda o, i: "/todos/", None),
+        ("GET /todos/?q=", "GET", lambda o, i: "/todos/", lambda o, i: {"params": {"q": f"todo {i % 50}", "sort": "-priority"}}),
+        ("GET /todos/export", "GET", lambda o, i: "/todos/export", None),
+        ("GET /todos/stats", "GET", lambda o, i: "/todos/stats", None),
+        ("GET /todos/changes", "GET", lambda o, i: "/todos/changes", None),
+        ("GET /todos/changes?since=", "GET", lambda o, i: "/todos/changes", lambda o, i: {"params": {"since": since}}),
+        ("GET /todos/{todo_id}", "GET", lambda o, i: f"/todos/{todo_id(o, i)}", None),
+        ("POST /todos/", "POST", lambda o, i: "/todos/", lambda o, i: {"json": TODO_BODY}),
+        ("PUT /todos/{todo_id}", "PUT", lambda o, i: f"/todos/{todo_id(o, i)}", lambda o, i: {"json": {**TODO_BODY, "priority": i % 5}}),
+        ("POST /todos/bulk", "POST", lambda o, i: "/todos/bulk", lambda o, i: {"json": [TODO_BODY] * 20}),
+        ("PATCH /todos/bulk", "PATCH", lambda o, i: "/todos/bulk", lambda o, i: {"json": [{"id": todo_id(o, i + n), "completed": True} for n in range(20)]}),
+        ("DELETE /todos/bulk", "DELETE", lambda o, i: "/todos/bulk", lambda o, i: {"json": [spare_todo_id(o, i)]}),
+        ("DELETE /todos/{todo_id}", "DELETE", lambda o, i: f"/todos/{spare_todo_id(o, i + reserve)}", None),
+    ]
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, tokens, scenario, requests: int, concurrency: int, offset: int = 0):
+    name, method, path, kwargs = scenario
+    latencies, errors = [], 0
+    counter = iter(range(offset, offset + requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            owner_id = i % len(tokens) + 1
+            request_kwargs = kwargs(owner_id, i) if kwargs else {}
+            started = time.perf_counter()
+            response = await client.request(
+                method, path(owner_id, i), headers={"Authorization": f"Bearer {tokens[owner_id - 1]}"}, **request_kwargs
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return name, {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run(args):
+    engine = create_async_engine(args.database_url)
+    session_factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    # every simulated user shares one client address; measure the routes, not the throttle
+    admission.enabled = False
+    # the ASGI transport skips the lifespan, so start the health monitor by hand
+    health_monitor.engine = engine
+    await health_monitor.check()
+    health_monitor.start()
+    tokens = [create_access_token(f"bench{user_id}", user_id, "user") for user_id in range(1, args.users + 1)]
+    selected = [scenario for scenario in scenarios(args.users, args.todos_per_user, reserve_size(args))
+                if not args.routes or any(route in scenario[0] for route in args.routes)]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in selected:
+            # a short warm-up so first-call costs (pools, caches, imports) stay out of the numbers
+            await run_scenario(client, tokens, scenario, args.concurrency, args.concurrency, offset=args.requests)
+            name, stats = await run_scenario(client, tokens, scenario, args.requests, args.concurrency)
+            results[name] = stats
+            print(f"{name:<28} {stats['throughput_rps']:>9.1f} rps  p50 {stats['p50_ms']:>8.2f}  "
+                  f"p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}")
+    app.dependency_overrides.clear()
+    await health_monitor.stop()
+    await engine.dispose()
+    return results
+
+
+def compare(results, baseline, threshold: float):
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get("routes", {}).get(name)
+        if before is None:
+            continue
+        if before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+        if before["throughput_rps"] and stats["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']:.1f} -> {stats['throughput_rps']:.1f} rps")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--todos-per-user", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--routes", nargs="*", help="only run routes whose name contains one of these")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    seed(args.database_url, args.users, args.todos_per_user, reserve_size(args))
+    results = asyncio.run(run(args))
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "routes": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
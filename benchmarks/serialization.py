@@ -0,0 +1,70 @@
+"""Compare the old and new serialization paths for todo list responses.
+
+Run from the directory that contains the package:
+
+    python -m fastapi_todo_list.benchmarks.serialization --sizes 100 1000 10000
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from ..models import Todos, TodoResponse
+
+todo_list_adapter = TypeAdapter(list[TodoResponse])
+
+
+def make_todos(count: int):
+    now = datetime.now(timezone.utc)
+    return [
+        Todos(
+            id=i,
+            title=f"Todo {i}",
+            description="Benchmark description",
+            priority=i % 5,
+            completed=i % 2 == 0,
+            created_at=now,
+            updated_at=now,
+            owner_id=1,
+        )
+        for i in range(count)
+    ]
+
+
+def encode_inferred(todos):
+    # what FastAPI did before: infer the shape of each ORM object and render with the stdlib json module
+    return JSONResponse(jsonable_encoder(todos)).body
+
+
+def encode_typed(todos):
+    # the response_model path: a compiled pydantic adapter feeding orjson
+    return ORJSONResponse(todo_list_adapter.dump_python(todo_list_adapter.validate_python(todos), mode="json")).body
+
+
+def best_of(func, todos, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(todos)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'inferred ms':>12} {'typed ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        todos = make_todos(size)
+        assert len(encode_typed(todos)) > 0
+        inferred = best_of(encode_inferred, todos, args.repeat)
+        typed = best_of(encode_typed, todos, args.repeat)
+        print(f"{size:>8} {inferred * 1000:>12.2f} {typed * 1000:>10.2f} {inferred / typed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
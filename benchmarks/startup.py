@@ -0,0 +1,125 @@
+"""Measure worker cold start: importing the app and serving its first request in a fresh process.
+
+Every run starts a new interpreter, times `import main` and one request to --path, and
+checks that none of the lazily loaded subsystems were pulled in along the way. One extra
+run under `python -X importtime` lists the slowest imports. The exit status is 1 when the
+median time to first response exceeds --budget-ms or a lazy module was imported.
+
+Run from anywhere:
+
+    python -m fastapi_todo_list.benchmarks.startup --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PACKAGE = __package__.rsplit(".", 1)[0]
+PACKAGE_PARENT = str(Path(__file__).resolve().parents[2])
+# loaded on first use; importing any of them at startup is a regression
+LAZY_MODULES = ("jose", "passlib", "bcrypt", "pymysql", "aiomysql", "concurrent.futures.process")
+
+FIRST_REQUEST = """
+import asyncio, json, sys, time
+import httpx
+started = time.perf_counter()
+from {package}.main import app
+imported = time.perf_counter()
+
+async def first_request():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        return (await client.get({path!r})).status_code
+
+status_code = asyncio.run(first_request())
+served = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_response_ms": (served - started) * 1000,
+    "status": status_code,
+    "lazy_modules_loaded": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def _run_python(*args):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [PACKAGE_PARENT, os.environ.get("PYTHONPATH")]))}
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, check=True)
+
+
+def measure(path: str):
+    started = time.perf_counter()
+    result = _run_python("-c", FIRST_REQUEST.format(package=PACKAGE, path=path, lazy=LAZY_MODULES))
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def parse_importtime(output: str):
+    """Parse `-X importtime` lines into (module, self_us, cumulative_us), skipping the header."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            modules.append((name, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def slowest_imports(limit: int):
+    result = _run_python("-X", "importtime", "-c", f"import {PACKAGE}.main")
+    modules = sorted(parse_importtime(result.stderr), key=lambda module: module[1], reverse=True)
+    return [{"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+            for name, self_us, cumulative_us in modules[:limit]]
+
+
+def check(samples, budget_ms: float):
+    failures = []
+    median = statistics.median(sample["first_response_ms"] for sample in samples)
+    if median > budget_ms:
+        failures.append(f"median time to first response {median:.1f} ms exceeds budget {budget_ms:.1f} ms")
+    loaded = sorted({name for sample in samples for name in sample["lazy_modules_loaded"]})
+    if loaded:
+        failures.append(f"imported at startup but should load lazily: {', '.join(loaded)}")
+    if any(sample["status"] >= 400 for sample in samples):
+        failures.append("first request failed")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health/live", help="route served as the first request")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="allowed median time to first response")
+    parser.add_argument("--top", type=int, default=15, help="how many of the slowest imports to list")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    samples = [measure(args.path) for _ in range(args.runs)]
+    summary = {
+        key: statistics.median(sample[key] for sample in samples)
+        for key in ("import_ms", "first_response_ms", "process_ms")
+    }
+    print(f"import {summary['import_ms']:.1f} ms  first response {summary['first_response_ms']:.1f} ms  "
+          f"process {summary['process_ms']:.1f} ms  (median of {args.runs})")
+    imports = slowest_imports(args.top)
+    for module in imports:
+        print(f"  {module['self_ms']:>8.1f} ms self  {module['cumulative_ms']:>8.1f} ms total  {module['module']}")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"config": vars(args), "median": summary, "samples": samples, "slowest_imports": imports},
+                      output, indent=2)
+    failures = check(samples, args.budget_ms)
+    for failure in failures:
+        print(f"FAILED {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from uuid import uuid4
+import orjson
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire at an absolute wall-clock time."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl: float | None = None, expires_at: float | None = None):
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class MemoryCacheBackend:
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    async def get(self, key):
+        return self._cache.get(key)
+
+    async def set(self, key, value, ttl: float | None = None):
+        self._cache.set(key, value, ttl=ttl)
+
+    async def add(self, key, value, ttl: float | None = None):
+        # TTLCache is only touched from the event loop thread, so check-then-set cannot interleave
+        current = self._cache.get(key)
+        if current is not None:
+            return current
+        self._cache.set(key, value, ttl=ttl)
+        return value
+
+    async def delete(self, key):
+        self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class RedisCacheBackend:
+    """Keys are expected to start with `namespace`, which is what clear() deletes."""
+
+    def __init__(self, url: str, namespace: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("The redis cache backend requires the 'redis' package") from exc
+        self._client = redis.from_url(url)
+        self.url = url
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key):
+        raw = await self._client.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orjson.loads(raw)
+
+    async def set(self, key, value, ttl: float | None = None):
+        await self._client.set(key, orjson.dumps(value), ex=int(ttl) if ttl else None)
+
+    async def add(self, key, value, ttl: float | None = None):
+        if await self._client.set(key, orjson.dumps(value), ex=int(ttl) if ttl else None, nx=True):
+            return value
+        return await self.get(key)
+
+    async def delete(self, key):
+        await self._client.delete(key)
+
+    def clear(self):
+        # a maintenance operation, so it uses a blocking client and can be called outside the event loop
+        import redis
+
+        client = redis.Redis.from_url(self.url)
+        try:
+            keys = []
+            for key in client.scan_iter(match=f"{self.namespace}:*", count=1000):
+                keys.append(key)
+                if len(keys) == 1000:
+                    client.delete(*keys)
+                    keys = []
+            if keys:
+                client.delete(*keys)
+        finally:
+            client.close()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class NullCacheBackend:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ttl: float | None = None):
+        pass
+
+    async def add(self, key, value, ttl: float | None = None):
+        return value
+
+    async def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def build_cache_backend(kind: str, maxsize: int, redis_url: str | None = None, namespace: str = "cache"):
+    if kind == "memory":
+        return MemoryCacheBackend(maxsize)
+    if kind == "redis":
+        return RedisCacheBackend(redis_url, namespace)
+    if kind == "none":
+        return NullCacheBackend()
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+class OwnerScopedCache:
+    """Per-owner read-through cache with generation based invalidation.
+
+    Every owner has a generation token and entries are stored under it. Invalidating
+    drops the token, so every entry for that owner becomes unreachable at once. Readers
+    take the generation before querying the database, which means a result computed
+    concurrently with a write is stored under the dropped generation and never served.
+    """
+
+    def __init__(self, backend, namespace: str, ttl: float):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _generation_key(self, owner_id):
+        return f"{self.namespace}:{owner_id}:generation"
+
+    async def get(self, owner_id, key):
+        generation = await self.backend.get(self._generation_key(owner_id))
+        if generation is None:
+            generation = await self.backend.add(self._generation_key(owner_id), uuid4().hex, ttl=self.ttl)
+            return generation, None
+        return generation, await self.backend.get(f"{self.namespace}:{owner_id}:{generation}:{key}")
+
+    async def set(self, owner_id, generation, key, value):
+        await self.backend.set(f"{self.namespace}:{owner_id}:{generation}:{key}", value, ttl=self.ttl)
+
+    async def invalidate(self, owner_id):
+        await self.backend.delete(self._generation_key(owner_id))
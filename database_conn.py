@@ -1,17 +1,105 @@
-from sqlalchemy import create_engine
+from functools import cache
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
-from .settings.base import DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME
+from .pool_metrics import MeteredAsyncQueuePool, pool_metrics
+from .query_metrics import instrument_engine
+from .settings.base import (
+    DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+)
 
 MYSQL_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_MYSQL_DATABASE_URL = f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
 
-engine = create_engine(MYSQL_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+# engines are built on first use: creating one imports the MySQL driver, which processes
+# that never touch the database (probes, Alembic offline mode) should not pay for
+@cache
+def get_engine():
+    # the sync engine is kept for scripts and tooling; the API runs on the async one
+    engine = create_engine(MYSQL_DATABASE_URL, pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE)
+    instrument_engine(engine)
+    return engine
+
+
+@cache
+def get_async_engine():
+    async_engine = create_async_engine(ASYNC_MYSQL_DATABASE_URL, poolclass=MeteredAsyncQueuePool, **POOL_OPTIONS)
+    instrument_engine(async_engine)
+    return async_engine
+
+
+@cache
+def get_sessionmaker():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@cache
+def get_async_sessionmaker():
+    return async_sessionmaker(bind=get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "async_engine": get_async_engine,
+    "SessionLocal": get_sessionmaker,
+    "AsyncSessionLocal": get_async_sessionmaker,
+}
+
+
+def __getattr__(name):
+    # keeps `from .database_conn import async_engine` working without building it at import
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def get_db():
+    async with get_async_sessionmaker()() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+def get_session_factory():
+    return get_async_sessionmaker()
+
+
+def get_pool_stats():
+    return pool_metrics.snapshot(get_async_engine().pool)
+
+
+async def update_returning(db, statement, model, *criteria):
+    # one round trip where the dialect has UPDATE ... RETURNING, otherwise UPDATE then SELECT
+    statement = statement.where(*criteria).execution_options(synchronize_session=False)
+    if db.bind.dialect.update_returning:
+        result = await db.execute(statement.returning(model))
+        return result.scalars().first()
+    result = await db.execute(statement)
+    if result.rowcount == 0:
+        return None
+    result = await db.execute(select(model).where(*criteria))
+    return result.scalars().first()
+
+
+async def delete_returning(db, statement, columns, *criteria):
+    # returns the deleted rows' columns, reading them first where DELETE ... RETURNING is unavailable
+    statement = statement.where(*criteria).execution_options(synchronize_session=False)
+    if db.bind.dialect.delete_returning:
+        result = await db.execute(statement.returning(*columns))
+        return result.all()
+    result = await db.execute(select(*columns).where(*criteria).with_for_update())
+    rows = result.all()
+    if rows:
+        await db.execute(statement)
+    return rows
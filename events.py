@@ -0,0 +1,199 @@
+"""Per-owner change feed for todos, streamed as Server-Sent Events by GET /todos/events.
+
+Each event carries an id. A client that reconnects with Last-Event-ID gets everything it
+missed, or a "reset" event when those events are no longer buffered and it has to refetch.
+"""
+import asyncio
+from collections import OrderedDict, deque
+from itertools import count
+from uuid import uuid4
+import orjson
+
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_RETRY_MS = 3000
+
+
+def format_sse(event_id: str | None, event: dict | None) -> str:
+    if event is None:
+        # comment line; keeps proxies from closing an idle stream
+        return ": keepalive\n\n"
+    return f"id: {event_id}\nevent: {event['type']}\ndata: {orjson.dumps(event).decode()}\n\n"
+
+
+async def sse_stream(events):
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    async for event_id, event in events:
+        yield format_sse(event_id, event)
+
+
+class _OwnerStream:
+    def __init__(self, buffer_size: int, generation: int):
+        self.generation = generation
+        self.buffer = deque(maxlen=buffer_size)
+        self.last_seq = 0
+        self.subscribers = set()
+
+
+class MemoryEventBroker:
+    """Fans events out to subscribers in this process and keeps the last `buffer_size` per owner.
+
+    Ids are "<epoch>-<generation>-<seq>". The epoch changes with every process and the generation
+    with every stream, so an id handed out before a restart, or before the owner's stream was
+    evicted and recreated, resolves to a reset instead of silently skipping events. A subscriber
+    that falls `queue_size` events behind is disconnected and resumes from its last id.
+    Once closed, new subscribers still get their replay but no live events.
+    """
+
+    def __init__(self, buffer_size: int, max_owners: int, queue_size: int, heartbeat: float):
+        self.buffer_size = buffer_size
+        self.max_owners = max_owners
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.epoch = uuid4().hex[:8]
+        self.closed = False
+        self._streams = OrderedDict()
+        self._generations = count(1)
+
+    def _stream(self, owner_id) -> _OwnerStream:
+        stream = self._streams.get(owner_id)
+        if stream is None:
+            stream = self._streams[owner_id] = _OwnerStream(self.buffer_size, next(self._generations))
+            while len(self._streams) > self.max_owners:
+                _, evicted = self._streams.popitem(last=False)
+                for queue in evicted.subscribers:
+                    self._disconnect(queue)
+        self._streams.move_to_end(owner_id)
+        return stream
+
+    def _disconnect(self, queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _event_id(self, stream: _OwnerStream, seq: int) -> str:
+        return f"{self.epoch}-{stream.generation}-{seq}"
+
+    async def publish(self, owner_id, event: dict) -> str:
+        stream = self._stream(owner_id)
+        stream.last_seq += 1
+        item = (self._event_id(stream, stream.last_seq), event)
+        stream.buffer.append((stream.last_seq, item))
+        for queue in list(stream.subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                stream.subscribers.discard(queue)
+                self._disconnect(queue)
+        return item[0]
+
+    def _replay(self, stream: _OwnerStream, last_event_id: str):
+        epoch, _, rest = last_event_id.partition("-")
+        generation, _, seq = rest.partition("-")
+        if (epoch, generation) != (self.epoch, str(stream.generation)) or not seq.isdigit() or int(seq) > stream.last_seq:
+            return None
+        oldest = stream.buffer[0][0] if stream.buffer else stream.last_seq + 1
+        if int(seq) < oldest - 1:
+            return None
+        return [item for event_seq, item in stream.buffer if event_seq > int(seq)]
+
+    async def subscribe(self, owner_id, last_event_id: str | None = None):
+        """Yield (event_id, event) pairs, and (None, None) after `heartbeat` idle seconds."""
+        stream = self._stream(owner_id)
+        queue = asyncio.Queue(self.queue_size)
+        # registering and replaying happen without an await in between, so nothing published
+        # meanwhile can be missed or delivered twice
+        stream.subscribers.add(queue)
+        try:
+            if last_event_id is not None:
+                replay = self._replay(stream, last_event_id)
+                if replay is None:
+                    yield self._event_id(stream, stream.last_seq), {"type": "reset"}
+                else:
+                    for item in replay:
+                        yield item
+            while not self.closed:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield None, None
+                    continue
+                if item is None:
+                    return
+                yield item
+        finally:
+            stream.subscribers.discard(queue)
+
+    def close(self):
+        self.closed = True
+        for stream in self._streams.values():
+            for queue in stream.subscribers:
+                self._disconnect(queue)
+            stream.subscribers.clear()
+
+
+class RedisEventBroker:
+    """Carries events across workers in one Redis stream per owner, trimmed to about `buffer_size`.
+
+    Every subscriber blocks on its own XREAD, so each open event stream holds a Redis connection.
+    """
+
+    def __init__(self, url: str, buffer_size: int, heartbeat: float, namespace: str = "todo_events"):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("The redis event backend requires the 'redis' package") from exc
+        self._client = redis.from_url(url)
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self.namespace = namespace
+
+    def _key(self, owner_id) -> str:
+        return f"{self.namespace}:{owner_id}:events"
+
+    async def publish(self, owner_id, event: dict) -> str:
+        event_id = await self._client.xadd(
+            self._key(owner_id), {"data": orjson.dumps(event)}, maxlen=self.buffer_size, approximate=True
+        )
+        return event_id.decode()
+
+    @staticmethod
+    def _parse_id(event_id: str):
+        milliseconds, _, seq = event_id.partition("-")
+        if not milliseconds.isdigit() or not seq.isdigit():
+            return None
+        return int(milliseconds), int(seq)
+
+    async def _latest_id(self, key) -> str:
+        latest = await self._client.xrevrange(key, count=1)
+        return latest[0][0].decode() if latest else "0-0"
+
+    async def subscribe(self, owner_id, last_event_id: str | None = None):
+        key = self._key(owner_id)
+        cursor = await self._latest_id(key) if last_event_id is None else last_event_id
+        if last_event_id is not None:
+            oldest = await self._client.xrange(key, count=1)
+            position = self._parse_id(last_event_id)
+            if position is None or (oldest and position < self._parse_id(oldest[0][0].decode())):
+                cursor = await self._latest_id(key)
+                yield cursor, {"type": "reset"}
+        while True:
+            entries = await self._client.xread({key: cursor}, count=100, block=int(self.heartbeat * 1000))
+            if not entries:
+                yield None, None
+                continue
+            for _, messages in entries:
+                for event_id, fields in messages:
+                    cursor = event_id.decode()
+                    yield cursor, orjson.loads(fields[b"data"])
+
+    def close(self):
+        pass
+
+
+def build_event_broker(kind: str, buffer_size: int, max_owners: int, queue_size: int, heartbeat: float,
+                       redis_url: str | None = None):
+    if kind == "memory":
+        return MemoryEventBroker(buffer_size, max_owners, queue_size, heartbeat)
+    if kind == "redis":
+        return RedisEventBroker(redis_url, buffer_size, heartbeat)
+    raise ValueError(f"Unknown event backend: {kind}")
@@ -0,0 +1,94 @@
+"""Group commit: concurrent writes coalesced into one transaction.
+
+A write waits up to `window_seconds` for others to join its batch, or until `max_batch` have
+arrived, and the whole batch is written and committed together, so one commit (and one fsync on
+the primary) serves every request in it. Each caller gets its own result back. When a batch
+fails, its writes are retried one transaction each, so only the offending write fails.
+"""
+import asyncio
+from .metrics import Histogram, registry
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+group_commit_batch_size = registry.register(Histogram(
+    "group_commit_batch_size", "Writes committed together per group-commit transaction.", ("name",),
+    buckets=BATCH_SIZE_BUCKETS,
+))
+
+
+def _resolve(future, result=None, exception=None):
+    # the caller may have gone away (client disconnect) while its write was committed
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class GroupCommitter:
+    """Batches are kept per session factory, so writes for different shards never share one.
+
+    `write(db, items)` adds the items to the session and returns one result per item; the
+    committer commits.
+    """
+
+    def __init__(self, name: str, write, window_seconds: float, max_batch: int, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.write = write
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._pending = {}
+        self._tasks = set()
+
+    async def submit(self, session_factory, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(session_factory, [])
+        batch.append((item, future))
+        if len(batch) >= self.max_batch:
+            self._start(self._flush(session_factory, batch))
+        elif len(batch) == 1:
+            self._start(self._flush_later(session_factory, batch))
+        return await future
+
+    def _start(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self, session_factory, batch):
+        await asyncio.sleep(self.window_seconds)
+        await self._flush(session_factory, batch)
+
+    async def _flush(self, session_factory, batch):
+        # the timer and a full batch can both fire; whichever comes second finds nothing to do
+        if self._pending.get(session_factory) is not batch:
+            return
+        del self._pending[session_factory]
+        group_commit_batch_size.observe((self.name,), len(batch))
+        try:
+            results = await self._commit(session_factory, [item for item, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                _resolve(batch[0][1], exception=exc)
+            else:
+                await asyncio.gather(*(self._retry_alone(session_factory, item, future) for item, future in batch))
+            return
+        for (_, future), result in zip(batch, results):
+            _resolve(future, result)
+
+    async def _commit(self, session_factory, items):
+        async with session_factory() as db:
+            results = await self.write(db, items)
+            await db.commit()
+        return results
+
+    async def _retry_alone(self, session_factory, item, future):
+        try:
+            (result,) = await self._commit(session_factory, [item])
+        except Exception as exc:
+            _resolve(future, exception=exc)
+        else:
+            _resolve(future, result)
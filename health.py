@@ -0,0 +1,106 @@
+import asyncio
+import time
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from .database_conn import get_async_engine
+from .settings.base import (
+    HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT, HEALTH_MAX_PING_SECONDS, HEALTH_MAX_POOL_UTILISATION,
+)
+
+
+def pool_utilisation(pool) -> float | None:
+    # None for pools without a fixed capacity (NullPool, StaticPool, unlimited overflow)
+    if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+        return None
+    capacity = pool.size() + pool._max_overflow
+    return pool.checkedout() / capacity if capacity else None
+
+
+class HealthMonitor:
+    """Pings the database in the background so probes only read the last result.
+
+    Not ready while the last ping failed or exceeded `max_ping_seconds`, while the pool is
+    above `max_pool_utilisation`, or when no check has completed for three intervals.
+    """
+
+    def __init__(self, engine=None, interval: float = HEALTH_CHECK_INTERVAL, timeout: float = HEALTH_CHECK_TIMEOUT,
+                 max_ping_seconds: float = HEALTH_MAX_PING_SECONDS,
+                 max_pool_utilisation: float = HEALTH_MAX_POOL_UTILISATION):
+        self._engine = engine
+        self.interval = interval
+        self.timeout = timeout
+        self.max_ping_seconds = max_ping_seconds
+        self.max_pool_utilisation = max_pool_utilisation
+        self.task = None
+        self.state = {"ready": False, "reason": "starting", "checked_at": None, "ping_ms": None, "pool_utilisation": None}
+
+    @property
+    def engine(self):
+        # defaults to the application engine, resolved lazily so importing this module stays cheap
+        return self._engine if self._engine is not None else get_async_engine()
+
+    @engine.setter
+    def engine(self, engine):
+        self._engine = engine
+
+    async def _ping(self):
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def check(self):
+        utilisation = pool_utilisation(self.engine.pool)
+        reason, ping_ms = None, None
+        if utilisation is not None and utilisation >= self.max_pool_utilisation:
+            # skip the ping: it would only queue behind the requests already waiting
+            reason = "connection pool saturated"
+        else:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._ping(), self.timeout)
+                ping_ms = (time.perf_counter() - started) * 1000
+                if ping_ms > self.max_ping_seconds * 1000:
+                    reason = "database ping too slow"
+            except asyncio.TimeoutError:
+                reason = "database ping timed out"
+            except Exception as exc:
+                reason = f"database unavailable: {type(exc).__name__}"
+        self.state = {
+            "ready": reason is None,
+            "reason": reason,
+            "checked_at": time.time(),
+            "ping_ms": ping_ms,
+            "pool_utilisation": utilisation,
+        }
+        return self.state
+
+    async def run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def alive(self) -> bool:
+        # a monitor task that died leaves readiness frozen; only a restart recovers it
+        return self.task is None or not self.task.done()
+
+    def snapshot(self) -> dict:
+        state = dict(self.state)
+        checked_at = state["checked_at"]
+        if state["ready"] and (checked_at is None or time.time() - checked_at > 3 * self.interval):
+            state["ready"], state["reason"] = False, "health check stale"
+        return state
+
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,103 @@
+"""Idempotency-Key support for the create routes.
+
+The first request with a key claims it and runs. Its response is kept for IDEMPOTENCY_TTL
+seconds and replayed to retries with the same key without running the handler again. A retry
+that arrives while the first is still running waits for it, up to IDEMPOTENCY_WAIT_SECONDS.
+Only successful responses are kept: when the handler fails, the claim is released so that a
+retry runs again. Reusing a key with a different body is refused with 422.
+"""
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated
+from uuid import uuid4
+from fastapi import Header, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from .cache import build_cache_backend
+from .settings.base import (
+    IDEMPOTENCY_BACKEND, IDEMPOTENCY_MAXSIZE, IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TTL, IDEMPOTENCY_WAIT_SECONDS, REDIS_URL,
+)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+idempotency_key_header = Annotated[str | None, Header(min_length=1, max_length=255)]
+
+
+class IdempotentCall:
+    def __init__(self, replay=None):
+        self.replay = replay
+        self.result = None
+
+    def save(self, status_code: int, body):
+        self.result = {"status": status_code, "body": body}
+
+
+class IdempotencyStore:
+    """Claims and stored responses live in a cache backend; the redis one spans workers."""
+
+    def __init__(self, backend, ttl: float, lock_ttl: float, wait_seconds: float, poll_interval: float = 0.05):
+        self.backend = backend
+        self.ttl = ttl
+        # a claim outlives a crashed worker by at most this long
+        self.lock_ttl = lock_ttl
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+
+    async def _claim(self, key: str, fingerprint: str):
+        """None once this request owns the key, otherwise the stored response to replay."""
+        token = uuid4().hex
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            record = await self.backend.add(key, {"token": token, "fingerprint": fingerprint}, ttl=self.lock_ttl)
+            if record is None:
+                # expired between the failed add and the read back; claim again
+                continue
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    detail="Idempotency-Key was already used with a different request",
+                )
+            if "status" in record:
+                return record
+            if record["token"] == token:
+                return None
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"},
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    @asynccontextmanager
+    async def run(self, scope: str, key: str | None, payload: str):
+        """Yield an IdempotentCall; replay `call.replay` if set, otherwise handle and `call.save`."""
+        if key is None:
+            yield IdempotentCall()
+            return
+        storage_key = f"idempotency:{scope}:{key}"
+        fingerprint = hashlib.sha256(payload.encode()).hexdigest()
+        record = await self._claim(storage_key, fingerprint)
+        if record is not None:
+            yield IdempotentCall(ORJSONResponse(record["body"], status_code=record["status"], headers={REPLAYED_HEADER: "true"}))
+            return
+        call = IdempotentCall()
+        try:
+            yield call
+        except BaseException:
+            await self.backend.delete(storage_key)
+            raise
+        if call.result is None:
+            await self.backend.delete(storage_key)
+        else:
+            await self.backend.set(storage_key, {"fingerprint": fingerprint, **call.result}, ttl=self.ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+
+idempotency = IdempotencyStore(
+    build_cache_backend(IDEMPOTENCY_BACKEND, IDEMPOTENCY_MAXSIZE, REDIS_URL, "idempotency"),
+    IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TTL, IDEMPOTENCY_WAIT_SECONDS,
+)
@@ -1,19 +1,94 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from starlette import status
 from .routers import auth, users, todos
+from .database_conn import get_pool_stats
+from .health import health_monitor
+from .metrics import PROMETHEUS_CONTENT_TYPE, Counter, Gauge, Histogram, PrometheusMiddleware, registry
+from .pool_metrics import pool_metrics
+from .query_metrics import QueryStatsMiddleware
+from .password_hashing import password_hasher
+from .replicas import replica_set
+from .sharding import shard_set
+from .routers.auth import token_cache
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health_monitor.start()
+    replica_set.start()
+    yield
+    await replica_set.stop()
+    await shard_set.dispose()
+    await health_monitor.stop()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(PrometheusMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(todos.router)
 
 
+def runtime_metrics():
+    pool = get_pool_stats()
+    checked_out = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.")
+    checked_out.set((), pool["checked_out"])
+    overflow = Gauge("db_pool_overflow", "Connections open beyond pool_size.")
+    overflow.set((), pool["overflow"])
+    checkout_latency = Histogram("db_pool_checkout_seconds", "Time spent waiting for a pool connection.", buckets=pool_metrics.buckets)
+    checkout_latency.series[()] = [list(pool_metrics.bucket_counts), pool_metrics.wait_seconds_total]
+    token_cache_lookups = Counter("token_cache_lookups_total", "Verified-token cache lookups by result.", ("result",))
+    token_cache_lookups.inc(("hit",), token_cache.hits)
+    token_cache_lookups.inc(("miss",), token_cache.misses)
+    health = health_monitor.snapshot()
+    ready = Gauge("db_ready", "1 when the last background database health check passed.")
+    ready.set((), int(health["ready"]))
+    return [checked_out, overflow, checkout_latency, token_cache_lookups, ready]
+
+
+registry.add_collector(runtime_metrics)
+
+
 @app.get("/health_check", status_code=status.HTTP_200_OK)
-def health_check():
-    service_healthy = True
-    if service_healthy:
+async def health_check():
+    if health_monitor.snapshot()["ready"]:
         return {"status": "healthy"}
     else:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service Unavailable")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service Unavailable")
+
+
+@app.get("/health/live", status_code=status.HTTP_200_OK)
+async def health_live():
+    if not health_monitor.alive():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Health monitor stopped")
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", status_code=status.HTTP_200_OK)
+async def health_ready():
+    # served from the background monitor's last result, so probes never touch the database
+    state = health_monitor.snapshot()
+    return ORJSONResponse(
+        {"status": "ready" if state["ready"] else "unavailable", **state},
+        status_code=status.HTTP_200_OK if state["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/pool_stats", status_code=status.HTTP_200_OK)
+async def pool_stats():
+    return get_pool_stats()
+
+
+@app.get("/token_cache_stats", status_code=status.HTTP_200_OK)
+async def token_cache_stats():
+    return token_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
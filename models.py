@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, DDL, event
+from sqlalchemy.dialects import mysql
 from sqlalchemy.sql import func
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from .database_conn import Base
 
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -20,6 +25,9 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # load created_at with the INSERT instead of a refresh afterwards
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class UserBase(BaseModel):
     username: str
@@ -42,6 +50,10 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+
+class MessageResponse(BaseModel):
+    message: str
+
     
 class Todos(Base):
     __tablename__ = "todos"
@@ -53,4 +65,89 @@ class Todos(Base):
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
\ No newline at end of file
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # stamped by the app on every insert and update; updated_at comes from the client, so delta
+    # sync and list ETags key on this instead
+    changed_at = Column(
+        DateTime(timezone=True).with_variant(mysql.DATETIME(fsp=6), "mysql"),
+        default=_utcnow, onupdate=_utcnow, nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_todos_owner_id_id", "owner_id", "id"),
+        Index("ix_todos_owner_id_completed", "owner_id", "completed"),
+        Index("ix_todos_owner_id_priority", "owner_id", "priority"),
+        Index("ix_todos_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_todos_owner_id_updated_at", "owner_id", "updated_at"),
+        Index("ix_todos_owner_id_changed_at", "owner_id", "changed_at"),
+        Index("ix_todos_title_description_fulltext", "title", "description", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
+
+class TodoStats(Base):
+    __tablename__ = "todo_stats"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    priority = Column(Integer, primary_key=True)
+    open_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+
+
+class TodoDeletions(Base):
+    """One row per deleted todo, so delta sync can report deletions."""
+    __tablename__ = "todo_deletions"
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    todo_id = Column(Integer, nullable=False)
+    # stamped by the app, on the same clock as delta-sync cursors and pruning
+    deleted_at = Column(DateTime(timezone=True), default=_utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_todo_deletions_owner_id_deleted_at", "owner_id", "deleted_at"),
+    )
+
+
+# SQLite has no FULLTEXT index, so tests search an external-content FTS5 table kept in sync by triggers.
+# These hang off the metadata rather than the table so they also run against an existing database file.
+TODOS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(title, description, content='todos', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN "
+    "INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE ON todos BEGIN "
+    "INSERT INTO todos_fts(todos_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO todos_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')",
+)
+for statement in TODOS_FTS_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+
+class TodoResponse(BaseModel):
+    id: int
+    title: str
+    description: str
+    priority: int
+    completed: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    owner_id: int
+
+    class Config:
+        from_attributes = True
+
+
+class TodoPriorityStats(BaseModel):
+    priority: int
+    open: int
+    completed: int
+
+
+class TodoStatsResponse(BaseModel):
+    open: int
+    completed: int
+    total: int
+    by_priority: list[TodoPriorityStats]
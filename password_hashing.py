@@ -0,0 +1,70 @@
+import asyncio
+from functools import cache
+from fastapi import HTTPException, status
+from .settings.base import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+
+@cache
+def get_bcrypt_context():
+    # passlib and bcrypt load on the first hash, in whichever process performs it
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def __getattr__(name):
+    if name == "bcrypt_context":
+        return get_bcrypt_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _hash(password: str) -> str:
+    return get_bcrypt_context().hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return get_bcrypt_context().verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt in worker processes so it never holds the event loop or the GIL."""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password hashing queue is full",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
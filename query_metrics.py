@@ -0,0 +1,119 @@
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from .metrics import Counter, Histogram, registry
+from .settings.base import SLOW_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+QUERY_COUNT_BUCKETS = (1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 100)
+
+db_queries_total = registry.register(Counter(
+    "db_queries_total", "SQL statements executed by operation.", ("operation",)
+))
+db_query_duration_seconds = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time by operation.", ("operation",)
+))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+))
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# set per request by QueryStatsMiddleware; greenlet_spawn keeps the caller's context,
+# so the engine listeners below see it even though they run inside the async bridge
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip()[:6].upper()
+    return keyword if keyword in OPERATIONS else "OTHER"
+
+
+def _value_shapes(parameters) -> str:
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters or ()) + ")"
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by name and type only, so logs never carry user data."""
+    if executemany:
+        return f"{len(parameters)} x {_value_shapes(parameters[0]) if parameters else '()'}"
+    return _value_shapes(parameters)
+
+
+def instrument_engine(engine, slow_query_seconds: float | None = SLOW_QUERY_SECONDS):
+    """Time every statement on `engine` and charge it to the current request.
+
+    Accepts a sync or async engine. Statements slower than `slow_query_seconds` are logged
+    with their parameter shapes; None turns the slow-query log off.
+    """
+    engine = getattr(engine, "sync_engine", engine)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        operation = _operation(statement)
+        db_queries_total.inc((operation,))
+        db_query_duration_seconds.observe((operation,), elapsed)
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+        if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+            logger.warning(
+                "slow query %.1f ms: %s params=%s",
+                elapsed * 1000, " ".join(statement.split()), parameter_shape(parameters, executemany),
+            )
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    return engine
+
+
+class QueryStatsMiddleware:
+    """Expose each request's statement count and DB time as X-DB-Query-Count and X-DB-Time-Ms.
+
+    Headers go out with the response start, so streamed bodies only report the queries run
+    before the first chunk; the per-route histogram is recorded once the body has finished.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_query_stats.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "<unmatched>"
+            http_request_db_queries.observe((scope["method"], template), stats.count)
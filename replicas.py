@@ -0,0 +1,118 @@
+import asyncio
+from contextvars import ContextVar
+from functools import cached_property
+from itertools import count
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .database_conn import POOL_OPTIONS, get_async_engine
+from .health import HealthMonitor
+from .metrics import Counter, registry
+from .query_metrics import instrument_engine
+from .settings.base import DB_REPLICA_URLS, READ_YOUR_WRITES_SECONDS, READ_YOUR_WRITES_MAXSIZE
+
+db_read_routing_total = registry.register(Counter(
+    "db_read_routing_total", "Read-only sessions by the engine they were routed to and why.", ("target",)
+))
+
+# the authenticated user of the current request, set by get_current_user; writes committed
+# under it pin that user's reads to the primary for READ_YOUR_WRITES_SECONDS
+read_your_writes_key: ContextVar[int | None] = ContextVar("read_your_writes_key", default=None)
+
+
+class Replica:
+    def __init__(self, url: str, engine_options: dict):
+        self.url = url
+        self.engine_options = engine_options
+
+    @cached_property
+    def engine(self):
+        engine = create_async_engine(self.url, **self.engine_options)
+        instrument_engine(engine)
+        return engine
+
+    @cached_property
+    def monitor(self):
+        return HealthMonitor(self.engine)
+
+    def healthy(self) -> bool:
+        return self.monitor.snapshot()["ready"]
+
+
+class ReadSession(Session):
+    """Session for read-only dependencies that chooses its engine on first use.
+
+    The choice waits until the first query so that get_current_user, which runs as a sibling
+    dependency, has already named the user whose recent writes must be visible.
+    """
+
+    def __init__(self, *args, replica_set, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica_set = replica_set
+        self._read_bind = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._read_bind is None:
+            self._read_bind = self.replica_set.choose(read_your_writes_key.get()).sync_engine
+        return self._read_bind
+
+
+class ReplicaSet:
+    """Round-robins reads across healthy replicas.
+
+    Reads go to the primary while the user is inside their read-your-writes window, or when
+    no replica passed its last health check.
+    """
+
+    def __init__(self, urls, window_seconds: float, maxsize: int, primary=get_async_engine, engine_options=POOL_OPTIONS):
+        self.replicas = [Replica(url, engine_options) for url in urls]
+        self.recent_writers = TTLCache(maxsize=maxsize, ttl=window_seconds)
+        self.primary = primary
+        self._next = count()
+
+    def mark_write(self, key):
+        if self.replicas:
+            self.recent_writers.set(key, True)
+
+    def choose(self, key=None):
+        if not self.replicas:
+            return self.primary()
+        if key is not None and self.recent_writers.get(key):
+            db_read_routing_total.inc(("primary_read_your_writes",))
+            return self.primary()
+        healthy = [replica for replica in self.replicas if replica.healthy()]
+        if not healthy:
+            db_read_routing_total.inc(("primary_fallback",))
+            return self.primary()
+        db_read_routing_total.inc(("replica",))
+        return healthy[next(self._next) % len(healthy)].engine
+
+    @cached_property
+    def session_factory(self):
+        return async_sessionmaker(
+            sync_session_class=ReadSession, replica_set=self, autoflush=False, expire_on_commit=False
+        )
+
+    def start(self):
+        for replica in self.replicas:
+            replica.monitor.start()
+
+    async def stop(self):
+        await asyncio.gather(*(replica.monitor.stop() for replica in self.replicas))
+        await asyncio.gather(*(replica.engine.dispose() for replica in self.replicas))
+
+
+replica_set = ReplicaSet(DB_REPLICA_URLS, READ_YOUR_WRITES_SECONDS, READ_YOUR_WRITES_MAXSIZE)
+
+
+@event.listens_for(Session, "after_commit")
+def _open_read_your_writes_window(session):
+    key = read_your_writes_key.get()
+    if key is not None and not isinstance(session, ReadSession):
+        replica_set.mark_write(key)
+
+
+async def get_read_db():
+    async with replica_set.session_factory() as db:
+        yield db
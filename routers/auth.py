@@ -1,14 +1,18 @@
-from ..database_conn import SessionLocal
+import hashlib
+from ..admission import admission, client_ip
+from ..cache import TTLCache
+from ..database_conn import get_db
 from ..models import User
-from passlib.context import CryptContext
-from fastapi import APIRouter, Depends, HTTPException, status
+from ..password_hashing import password_hasher
+from ..replicas import get_read_db, read_your_writes_key
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from ..settings import base
 from datetime import timedelta, datetime, timezone
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
-from jose import JWTError, jwt
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -17,28 +21,33 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
-db_dependency = Annotated[Session, Depends(get_db)]
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/auth/token")
+token_cache = TTLCache(maxsize=base.TOKEN_CACHE_MAXSIZE)
 
 
-def authenticate_user(username: str, password:str, db):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(username: str, password:str, db, read_db=None):
+    statement = select(User).where(User.username == username)
+    user = None
+    if read_db is not None:
+        result = await read_db.execute(statement)
+        user = result.scalars().first()
+    if user is None:
+        # a replica may not have the account yet if it signed up moments ago
+        result = await db.execute(statement)
+        user = result.scalars().first()
     if not user: 
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return False
     return user
 
 def create_access_token(username: str, user_id: int, role: str, expires_delta: timedelta | None = None):
+    # python-jose is imported on first use to keep it out of worker cold start
+    from jose import jwt
+
     payload = {
         "sub": username,
         "id": user_id,
@@ -52,8 +61,9 @@ def create_access_token(username: str, user_id: int, role: str, expires_delta: t
     return jwt.encode(payload, base.SECRET_KEY, algorithm=base.ALGORITHM)
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(db: db_dependency, form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login_for_access_token(db: db_dependency, read_db: read_db_dependency, request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    async with admission.admit("login", client_ip(request), form_data.username):
+        user = await authenticate_user(form_data.username, form_data.password, db, read_db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     access_token = create_access_token(user.username, user.id, user.role)
@@ -62,16 +72,28 @@ def login_for_access_token(db: db_dependency, form_data: OAuth2PasswordRequestFo
         "token_type": "bearer"
     }
 
-def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    # tokens are resent for their whole lifetime, so skip the signature check on repeats
+    token_digest = hashlib.sha256(token.encode()).hexdigest()
+    claims = token_cache.get(token_digest)
+    if claims is not None:
+        read_your_writes_key.set(claims["user_id"])
+        return claims
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, base.SECRET_KEY, algorithms=[base.ALGORITHM])
         username: str = payload.get("sub")
         user_id: int = payload.get("id")
         user_role: str = payload.get("role")
-        return {
+        claims = {
             "username": username,
             "user_id": user_id,
             "user_role": user_role
         }
     except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    if payload.get("exp") is not None:
+        token_cache.set(token_digest, claims, expires_at=payload["exp"])
+    read_your_writes_key.set(user_id)
+    return claims
@@ -1,21 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database_conn import SessionLocal
-from ..models import Todos
+import base64
+import json
+import re
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from sqlalchemy import Integer, and_, column, delete, false, func, or_, select, text, update
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import OwnerScopedCache, build_cache_backend
+from ..database_conn import get_db, get_session_factory, delete_returning
+from ..etag import etag_matches, make_etag, not_modified
+from ..idempotency import idempotency, idempotency_key_header
+from .. import replicas
+from ..events import SSE_MEDIA_TYPE, build_event_broker, sse_stream
+from ..group_commit import GroupCommitter
+from ..sharding import get_todo_db, get_todo_read_db, get_todo_session_factory
+from ..models import Todos, TodoResponse, TodoStatsResponse, MessageResponse
+from fastapi.responses import StreamingResponse
+from ..settings import base
+from ..streaming import ndjson_response
+from ..todo_changes import cursor_expired, decode_cursor, read_changes, record_deletions
+from ..todo_stats import TodoStatsDelta, read_todo_stats
 from .auth import get_current_user
-from typing import Annotated
-from pydantic import BaseModel
+from typing import Annotated, Callable, Literal
+from pydantic import BaseModel, Field, TypeAdapter
 from datetime import datetime
 
 router = APIRouter(prefix="/todos", tags=["todos"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class TodoRequest(BaseModel):
     title: str
     description: str
@@ -25,71 +35,442 @@ class TodoRequest(BaseModel):
     updated_at: datetime
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+class TodoBulkUpdateItem(BaseModel):
+    id: int
+    title: str | None = None
+    description: str | None = None
+    priority: int | None = None
+    completed: bool | None = None
+    updated_at: datetime | None = None
+
+
+class TodoBulkResult(BaseModel):
+    id: int
+    status: str
+
+
+class TodoBulkResponse(BaseModel):
+    results: list[TodoBulkResult]
+
+
+class TodoChangesResponse(BaseModel):
+    todos: list[TodoResponse]
+    deleted: list[int]
+    next_cursor: str
+    has_more: bool
+
+
+class TodoListParams(BaseModel):
+    limit: int = Field(100, ge=1, le=1000)
+    after: str | None = None
+    sort: Literal["id", "-id", "priority", "-priority", "created_at", "-created_at"] = "id"
+    completed: bool | None = None
+    priority_min: int | None = None
+    priority_max: int | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    updated_after: datetime | None = None
+    updated_before: datetime | None = None
+    q: str | None = Field(None, min_length=1, max_length=100)
+
+
+SORT_COLUMNS = {"id": Todos.id, "priority": Todos.priority, "created_at": Todos.created_at}
+BULK_MAX_ITEMS = 1000
+bulk_body = Body(min_length=1, max_length=BULK_MAX_ITEMS)
+
+# sessions on the owner's shard, or on the main database when todos are not sharded
+db_dependency = Annotated[AsyncSession, Depends(get_todo_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_todo_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
+session_factory_dependency = Annotated[Callable[[], AsyncSession], Depends(get_todo_session_factory)]
+todo_cache = OwnerScopedCache(
+    build_cache_backend(base.TODO_CACHE_BACKEND, base.TODO_CACHE_MAXSIZE, base.REDIS_URL, "todos"),
+    namespace="todos",
+    ttl=base.TODO_CACHE_TTL,
+)
+todo_events = build_event_broker(
+    base.TODO_EVENTS_BACKEND, base.TODO_EVENTS_BUFFER, base.TODO_EVENTS_MAX_OWNERS,
+    base.TODO_EVENTS_QUEUE_SIZE, base.TODO_EVENTS_HEARTBEAT, base.REDIS_URL,
+)
 
-@router.get("/", status_code=status.HTTP_200_OK)
-def get_todos(db: db_dependency, user: user_dependency):
-    todos = db.query(Todos).filter(Todos.owner_id == user["user_id"]).all()
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def get_todos(
+    db: read_db_dependency,
+    user: user_dependency,
+    request: Request,
+    params: Annotated[TodoListParams, Query()],
+):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    if todos is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todos not found")
-    return todos
+    # pages are cached as encoded JSON, so a hit is returned without validating or serializing again
+    cache_key = f"list-json:{params.model_dump_json()}"
+    generation, page = await todo_cache.get(user["user_id"], cache_key)
+    if page is None:
+        etag = await _todo_list_etag(db, user["user_id"], cache_key)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        result = await db.execute(_todo_list_query(db, user["user_id"], params))
+        todos = result.scalars().all()
+        next_cursor = None
+        if len(todos) > params.limit:
+            todos = todos[:params.limit]
+            next_cursor = _encode_cursor(params.sort, todos[-1])
+        body = todo_list_adapter.dump_json(todo_list_adapter.validate_python(todos)).decode()
+        page = {"body": body, "next_cursor": next_cursor, "etag": etag}
+        await todo_cache.set(user["user_id"], generation, cache_key, page)
+    elif etag_matches(request, page["etag"]):
+        return not_modified(page["etag"])
+    headers = {"ETag": page["etag"]}
+    if page["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    return _json_response(page["body"], headers)
 
 
-@router.get("/{todo_id}", status_code=status.HTTP_200_OK)
-def get_todo(db: db_dependency, user: user_dependency, todo_id: int):
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+@router.get("/export", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_todos(session_factory: session_factory_dependency, user: user_dependency):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    if todo is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-    return todo
+    statement = select(*Todos.__table__.columns).where(Todos.owner_id == user["user_id"]).order_by(Todos.id)
+    return ndjson_response(session_factory, statement)
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=TodoStatsResponse)
+async def get_todo_stats(db: read_db_dependency, user: user_dependency):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return await read_todo_stats(db, user["user_id"])
+
+
+@router.get("/changes", status_code=status.HTTP_200_OK, response_model=TodoChangesResponse)
+async def get_todo_changes(
+    db: db_dependency,
+    user: user_dependency,
+    since: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 500,
+):
+    # reads the primary: a lagging replica could hand out a cursor past rows it has not applied yet
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    cursor = None
+    if since is not None:
+        try:
+            cursor = decode_cursor(since)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        if cursor_expired(cursor):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor expired, resync without since")
+    return await read_changes(db, user["user_id"], cursor, limit)
+
+
+@router.get("/events", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def todo_events_stream(user: user_dependency, last_event_id: Annotated[str | None, Header()] = None):
+    # "created" and "updated" events carry whole todos as GET /todos/{id} returns them, "deleted"
+    # events their ids; "reset" means the client must refetch
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return StreamingResponse(
+        sse_stream(todo_events.subscribe(user["user_id"], last_event_id)),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED, response_model=TodoBulkResponse)
+async def bulk_create_todos(db: db_dependency, user: user_dependency, todo_requests: Annotated[list[TodoRequest], bulk_body]):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    todos = [
+        Todos(
+            title=todo_request.title,
+            description=todo_request.description,
+            priority=todo_request.priority,
+            completed=todo_request.completed,
+            owner_id=user["user_id"],
+            created_at=todo_request.created_at,
+            updated_at=todo_request.updated_at
+        )
+        for todo_request in todo_requests
+    ]
+    await _insert_todos(db, todos)
+    await db.commit()
+    await todo_cache.invalidate(user["user_id"])
+    await todo_events.publish(user["user_id"], {"type": "created", "todos": [_serialize(todo) for todo in todos]})
+    return {"results": [{"id": todo.id, "status": "created"} for todo in todos]}
+
+
+@router.patch("/bulk", status_code=status.HTTP_200_OK, response_model=TodoBulkResponse)
+async def bulk_update_todos(db: db_dependency, user: user_dependency, items: Annotated[list[TodoBulkUpdateItem], bulk_body]):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    owned = await _owned_todos(db, user["user_id"], [item.id for item in items])
+    rows = [item.model_dump(exclude_none=True) for item in items if item.id in owned]
+    rows = [row for row in rows if len(row) > 1]
+    if rows:
+        stats = TodoStatsDelta()
+        for row in rows:
+            priority, completed = owned[row["id"]]
+            stats.add(user["user_id"], priority, completed, -1)
+            owned[row["id"]] = (row.get("priority", priority), row.get("completed", completed))
+            stats.add(user["user_id"], *owned[row["id"]])
+        await db.execute(update(Todos), rows)
+        await stats.apply(db)
+        # the event carries whole todos, as update_todo's does, not just the patched fields
+        result = await db.execute(
+            select(Todos).where(Todos.owner_id == user["user_id"], Todos.id.in_([row["id"] for row in rows])).order_by(Todos.id)
+        )
+        updated = [_serialize(todo) for todo in result.scalars()]
+        await db.commit()
+        await todo_cache.invalidate(user["user_id"])
+        await todo_events.publish(user["user_id"], {"type": "updated", "todos": updated})
+    return {"results": [{"id": item.id, "status": "updated" if item.id in owned else "not_found"} for item in items]}
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def create_todo(db: db_dependency, user: user_dependency, todo_request: TodoRequest):
-    todo = Todos(
-        title=todo_request.title,
-        description=todo_request.description,
-        priority=todo_request.priority,
-        owner_id=user["user_id"],
-        created_at=todo_request.created_at,
-        updated_at=todo_request.updated_at
+@router.delete("/bulk", status_code=status.HTTP_200_OK, response_model=TodoBulkResponse)
+async def bulk_delete_todos(db: db_dependency, user: user_dependency, todo_ids: Annotated[list[int], bulk_body]):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    owned = await _owned_todos(db, user["user_id"], todo_ids)
+    if owned:
+        await db.execute(delete(Todos).where(Todos.owner_id == user["user_id"], Todos.id.in_(owned)))
+        await record_deletions(db, user["user_id"], list(owned))
+        stats = TodoStatsDelta()
+        for priority, completed in owned.values():
+            stats.add(user["user_id"], priority, completed, -1)
+        await stats.apply(db)
+        await db.commit()
+        await todo_cache.invalidate(user["user_id"])
+        await todo_events.publish(user["user_id"], {"type": "deleted", "ids": list(owned)})
+    return {"results": [{"id": todo_id, "status": "deleted" if todo_id in owned else "not_found"} for todo_id in todo_ids]}
+
+
+async def _todo_list_etag(db, owner_id: int, cache_key: str) -> str:
+    # one aggregate over the owner's index range instead of loading the rows; changed_at is stamped
+    # by the server on every write, unlike the client-supplied updated_at
+    result = await db.execute(
+        select(func.count(Todos.id), func.max(Todos.id), func.max(Todos.changed_at))
+        .where(Todos.owner_id == owner_id)
+    )
+    count, max_id, last_modified = result.one()
+    return make_etag(owner_id, count, max_id, last_modified, cache_key)
+
+
+def _todo_list_query(db, owner_id: int, params: TodoListParams):
+    # every filter is prefixed by owner_id so it lands on one of the (owner_id, ...) indexes
+    query = select(Todos).where(Todos.owner_id == owner_id)
+    if params.completed is not None:
+        query = query.where(Todos.completed == params.completed)
+    if params.priority_min is not None:
+        query = query.where(Todos.priority >= params.priority_min)
+    if params.priority_max is not None:
+        query = query.where(Todos.priority <= params.priority_max)
+    if params.created_after is not None:
+        query = query.where(Todos.created_at >= params.created_after)
+    if params.created_before is not None:
+        query = query.where(Todos.created_at < params.created_before)
+    if params.updated_after is not None:
+        query = query.where(Todos.updated_at >= params.updated_after)
+    if params.updated_before is not None:
+        query = query.where(Todos.updated_at < params.updated_before)
+    if params.q is not None:
+        query = query.where(_text_search(db.get_bind().dialect.name, params.q))
+
+    # keyset pagination on (sort column, id); the id tie-breaker keeps the order stable
+    descending = params.sort.startswith("-")
+    sort_field = params.sort.lstrip("-")
+    sort_column = SORT_COLUMNS[sort_field]
+    if params.after is not None:
+        value, last_id = _decode_cursor(sort_field, params.after)
+        if sort_field == "id":
+            query = query.where(Todos.id < last_id if descending else Todos.id > last_id)
+        elif descending:
+            query = query.where(or_(sort_column < value, and_(sort_column == value, Todos.id < last_id)))
+        else:
+            query = query.where(or_(sort_column > value, and_(sort_column == value, Todos.id > last_id)))
+    order = [sort_column.desc(), Todos.id.desc()] if descending else [sort_column.asc(), Todos.id.asc()]
+    if sort_field == "id":
+        order = order[:1]
+    return query.order_by(*order).limit(params.limit + 1)
+
+
+def _text_search(dialect_name: str, q: str):
+    # both full-text dialects require every word of q as a word prefix; punctuation only separates words
+    words = re.findall(r"\w+", q)
+    if dialect_name in ("mysql", "sqlite") and not words:
+        return false()
+    if dialect_name == "mysql":
+        # served by ix_todos_title_description_fulltext
+        boolean_query = " ".join(f"+{word}*" for word in words)
+        return match(Todos.title, Todos.description, against=boolean_query).in_boolean_mode()
+    if dialect_name == "sqlite":
+        fts_query = " ".join(f'"{word}"*' for word in words)
+        matches = text("SELECT rowid FROM todos_fts WHERE todos_fts MATCH :fts_query").bindparams(fts_query=fts_query)
+        return Todos.id.in_(matches.columns(column("rowid", Integer)))
+    pattern = f"%{q}%"
+    return or_(Todos.title.ilike(pattern), Todos.description.ilike(pattern))
+
+
+def _encode_cursor(sort: str, todo) -> str:
+    sort_field = sort.lstrip("-")
+    if sort_field == "id":
+        return str(todo.id)
+    value = getattr(todo, sort_field)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, todo.id]).encode()).decode()
+
+
+def _decode_cursor(sort_field: str, cursor: str):
+    try:
+        if sort_field == "id":
+            return None, int(cursor)
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_field == "created_at":
+            value = datetime.fromisoformat(value)
+        return value, int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def _insert_todos(db, todos):
+    """Insert todos and count them in todo_stats, in the caller's transaction.
+
+    One flush lets SQLAlchemy batch the rows into multi-row INSERT ... RETURNING where the dialect
+    can return generated ids (SQLite, PostgreSQL, MariaDB). MySQL cannot, so on aiomysql the flush
+    still runs one INSERT per todo, in the same transaction and commit.
+    """
+    db.add_all(todos)
+    await db.flush()
+    stats = TodoStatsDelta()
+    for todo in todos:
+        stats.add(todo.owner_id, todo.priority, todo.completed)
+    await stats.apply(db)
+    return todos
+
+
+# opt-in: concurrent create_todo calls share one INSERT and commit per TODO_GROUP_COMMIT_WINDOW
+todo_group_commit = GroupCommitter(
+    "create_todo", _insert_todos, base.TODO_GROUP_COMMIT_WINDOW, base.TODO_GROUP_COMMIT_MAX_BATCH,
+    enabled=base.TODO_GROUP_COMMIT,
+)
+
+
+def _serialize(todo):
+    return TodoResponse.model_validate(todo).model_dump(mode="json")
+
+
+todo_list_adapter = TypeAdapter(list[TodoResponse])
+
+
+def _json_response(body: str, headers=None) -> Response:
+    # for bodies already validated and encoded against the route's response_model
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _owned_todos(db, owner_id: int, todo_ids: list[int]) -> dict[int, tuple]:
+    # maps each id the owner has to its counted (priority, completed) pair, locking the rows
+    result = await db.execute(
+        select(Todos.id, Todos.priority, Todos.completed)
+        .where(Todos.owner_id == owner_id, Todos.id.in_(set(todo_ids)))
+        .with_for_update()
     )
-    db.add(todo)
-    db.commit()
-    db.refresh(todo)
+    return {todo_id: (priority, completed) for todo_id, priority, completed in result.all()}
+
+
+@router.get("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def get_todo(db: read_db_dependency, user: user_dependency, todo_id: int):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    cache_key = f"item-json:{todo_id}"
+    generation, body = await todo_cache.get(user["user_id"], cache_key)
+    if body is None:
+        result = await db.execute(select(Todos).where(Todos.id == todo_id, Todos.owner_id == user["user_id"]))
+        todo = result.scalars().first()
+        if todo is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+        body = TodoResponse.model_validate(todo).model_dump_json()
+        await todo_cache.set(user["user_id"], generation, cache_key, body)
+    return _json_response(body)
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=TodoResponse)
+async def create_todo(
+    db: db_dependency,
+    user: user_dependency,
+    session_factory: session_factory_dependency,
+    todo_request: TodoRequest,
+    idempotency_key: idempotency_key_header = None,
+):
+    async with idempotency.run(f"todos:{user['user_id']}", idempotency_key, todo_request.model_dump_json()) as call:
+        if call.replay is not None:
+            return call.replay
+        todo = Todos(
+            title=todo_request.title,
+            description=todo_request.description,
+            priority=todo_request.priority,
+            owner_id=user["user_id"],
+            created_at=todo_request.created_at,
+            updated_at=todo_request.updated_at
+        )
+        if todo_group_commit.enabled:
+            # committed in a batch on its own session; the request's session takes no connection
+            todo = await todo_group_commit.submit(session_factory, todo)
+            # the batch commits in a task copied from its first submitter's context, so the
+            # after_commit hook opens the read-your-writes window for that user only
+            replicas.replica_set.mark_write(user["user_id"])
+        else:
+            await _insert_todos(db, [todo])
+            await db.commit()
+        await todo_cache.invalidate(user["user_id"])
+        body = _serialize(todo)
+        await todo_events.publish(user["user_id"], {"type": "created", "todos": [body]})
+        call.save(status.HTTP_201_CREATED, body)
     return todo
 
 
-@router.put("/{todo_id}", status_code=status.HTTP_200_OK)
-def update_todo(db: db_dependency, user: user_dependency, todo_id: int, todo_request: TodoRequest):
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+@router.put("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def update_todo(db: db_dependency, user: user_dependency, todo_id: int, todo_request: TodoRequest):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    # the counters need the old priority and completed flag, so the row is locked and read whole
+    # once; the response is built from it, with no RETURNING or read back, on every dialect
+    result = await db.execute(
+        select(Todos).where(Todos.id == todo_id, Todos.owner_id == user["user_id"]).with_for_update()
+    )
+    todo = result.scalars().first()
     if todo is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    previous = (todo.priority, todo.completed)
     todo.title = todo_request.title
     todo.description = todo_request.description
     todo.priority = todo_request.priority
     todo.completed = todo_request.completed
     todo.updated_at = todo_request.updated_at
-    db.commit()
-    db.refresh(todo)
+    stats = TodoStatsDelta()
+    stats.add(todo.owner_id, *previous, -1)
+    stats.add(todo.owner_id, todo.priority, todo.completed)
+    await stats.apply(db)
+    await db.commit()
+    await todo_cache.invalidate(user["user_id"])
+    await todo_events.publish(user["user_id"], {"type": "updated", "todos": [_serialize(todo)]})
     return todo
 
 
-@router.delete("/{todo_id}", status_code=status.HTTP_200_OK)
-def delete_todo(db: db_dependency, user: user_dependency, todo_id: int):
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+@router.delete("/{todo_id}", status_code=status.HTTP_200_OK, response_model=MessageResponse)
+async def delete_todo(db: db_dependency, user: user_dependency, todo_id: int):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    if todo is None:
+    deleted = await delete_returning(
+        db, delete(Todos), (Todos.priority, Todos.completed), Todos.id == todo_id, Todos.owner_id == user["user_id"]
+    )
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
-    db.delete(todo)
-    db.commit()
+    stats = TodoStatsDelta()
+    stats.add(user["user_id"], *deleted[0], -1)
+    await stats.apply(db)
+    await record_deletions(db, user["user_id"], [todo_id])
+    await db.commit()
+    await todo_cache.invalidate(user["user_id"])
+    await todo_events.publish(user["user_id"], {"type": "deleted", "ids": [todo_id]})
     return {
         "message": "Todo deleted successfully"
-    }
\ No newline at end of file
+    }
@@ -1,81 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from starlette import status
 from pydantic import BaseModel, EmailStr
-from typing import Annotated
-from sqlalchemy.orm import Session
-from ..models import User, UserCreate, UserResponse
-from ..database_conn import SessionLocal
+from typing import Annotated, Callable
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import User, UserCreate, UserResponse, MessageResponse
+from ..database_conn import get_db, get_session_factory, update_returning
+from ..etag import etag_matches, make_etag, not_modified
+from fastapi.responses import StreamingResponse
+from ..streaming import ndjson_response
 from .auth import get_current_user
-from passlib.context import CryptContext
+from ..password_hashing import password_hasher
+from ..admission import admission, client_ip
+from ..idempotency import idempotency, idempotency_key_header
+from ..replicas import get_read_db
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+session_factory_dependency = Annotated[Callable[[], AsyncSession], Depends(get_session_factory)]
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-@router.get("/", status_code=status.HTTP_200_OK)
-def get_users(db: db_dependency, user: user_dependency):
-    users = db.query(User).all()
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[UserResponse])
+async def get_users(db: read_db_dependency, user: user_dependency):
+    result = await db.execute(select(User))
+    users = result.scalars().all()
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
     return users
 
-@router.get("/{user_id}", status_code=status.HTTP_200_OK)
-def get_user(db: db_dependency, user_id: int, user: user_dependency):
-    user = db.query(User).filter(User.id == user_id).first()
+@router.get("/export", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_users(session_factory: session_factory_dependency, user: user_dependency):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    columns = [User.__table__.c[name] for name in UserResponse.model_fields]
+    return ndjson_response(session_factory, select(*columns).order_by(User.id))
+
+@router.get("/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
+async def get_user(db: read_db_dependency, user_id: int, user: user_dependency, request: Request, response: Response):
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # a single row is as cheap to hash in full as any aggregate, and that keeps the tag strong
+    body = UserResponse.model_validate(user).model_dump_json()
+    etag = make_etag(body)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return user
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserResponse)
-def create_user(db: db_dependency, user_request: UserCreate):
-    user = User(
+async def create_user(db: db_dependency, user_request: UserCreate, request: Request,
+                      idempotency_key: idempotency_key_header = None):
+    # a replayed retry skips the throttle and bcrypt; the password stays out of the stored fingerprint
+    payload = user_request.model_dump_json(exclude={"hashed_password"})
+    async with idempotency.run("users", idempotency_key, payload) as call:
+        if call.replay is not None:
+            return call.replay
+        async with admission.admit("signup", client_ip(request), user_request.username):
+            hashed_password = await password_hasher.hash(user_request.hashed_password)
+        user = User(
+            username=user_request.username,
+            first_name=user_request.first_name,
+            last_name=user_request.last_name,
+            email=user_request.email,
+            hashed_password=hashed_password,
+            role=user_request.role,
+            phone_number=user_request.phone_number,
+            is_active=user_request.is_active
+        )
+        db.add(user)
+        await db.commit()
+        call.save(status.HTTP_201_CREATED, UserResponse.model_validate(user).model_dump(mode="json"))
+    return user
+
+@router.put("/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
+async def update_user(db: db_dependency, user_id: int, user_request: UserCreate, user: user_dependency):
+    statement = update(User).values(
         username=user_request.username,
         first_name=user_request.first_name,
         last_name=user_request.last_name,
         email=user_request.email,
-        hashed_password=bcrypt_context.hash(user_request.hashed_password),
+        hashed_password=await password_hasher.hash(user_request.hashed_password),
         role=user_request.role,
-        phone_number=user_request.phone_number,
         is_active=user_request.is_active
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
-
-@router.put("/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponse)
-def update_user(db: db_dependency, user_id: int, user_request: UserCreate, user: user_dependency):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await update_returning(db, statement, User, User.id == user_id)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    user.username = user_request.username
-    user.first_name = user_request.first_name
-    user.last_name = user_request.last_name
-    user.email = user_request.email
-    user.hashed_password = bcrypt_context.hash(user_request.hashed_password)
-    user.role = user_request.role
-    user.is_active = user_request.is_active
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     return user
 
-@router.delete("/{user_id}", status_code=status.HTTP_200_OK)
-def delete_user(db: db_dependency, user_id: int, user: user_dependency):
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+@router.delete("/{user_id}", status_code=status.HTTP_200_OK, response_model=MessageResponse)
+async def delete_user(db: db_dependency, user_id: int, user: user_dependency):
+    result = await db.execute(delete(User).where(User.id == user_id).execution_options(synchronize_session=False))
+    if result.rowcount == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    db.delete(user)
-    db.commit()
-    return {"message": "User deleted successfully"}
\ No newline at end of file
+    await db.commit()
+    return {"message": "User deleted successfully"}
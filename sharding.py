@@ -0,0 +1,253 @@
+"""Owner-sharded todo storage.
+
+Each owner's rows in the per-shard tables, todos, todo_stats and todo_deletions, live together on one
+shard, picked by a consistent-hash ring over TODO_SHARD_URLS. With no shards configured, todos stay in
+the main database. The todo_stats rebuild and todo_deletions prune commands run on every shard.
+
+Create the todo tables on every shard, and after adding or removing a shard, move the
+owners whose ring position changed:
+
+    python -m fastapi_todo_list.sharding create-schema
+    python -m fastapi_todo_list.sharding rebalance [--owner OWNER_ID] [--dry-run]
+
+Todo ids are kept when an owner moves, so shards must hand out disjoint ids (on MySQL, give
+each shard its own auto_increment_offset). A move stops with ShardConflict rather than
+overwrite another owner's row.
+"""
+import argparse
+import asyncio
+import hashlib
+from bisect import bisect
+from typing import Annotated
+from fastapi import Depends
+from sqlalchemy import MetaData, delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from .database_conn import POOL_OPTIONS, get_db, get_session_factory
+from .models import TODOS_FTS_DDL, TodoDeletions, Todos, TodoStats
+from .query_metrics import instrument_engine
+from .replicas import get_read_db
+from .routers.auth import get_current_user
+from .settings.base import TODO_SHARD_URLS, TODO_SHARD_VNODES
+from .todo_stats import rebuild_statements
+
+MOVE_CHUNK_SIZE = 1000
+
+
+class ShardConflict(Exception):
+    pass
+
+
+def _ring_hash(key: str) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring with `vnodes` points per shard.
+
+    Adding a shard only moves the owners that now land on it; nobody moves between the
+    shards that were already there.
+    """
+
+    def __init__(self, names, vnodes: int = TODO_SHARD_VNODES):
+        self.points = sorted((_ring_hash(f"{name}#{index}"), name) for name in names for index in range(vnodes))
+        self._hashes = [point for point, _ in self.points]
+
+    def shard_for(self, owner_id: int) -> str:
+        index = bisect(self._hashes, _ring_hash(str(owner_id))) % len(self.points)
+        return self.points[index][1]
+
+
+class ShardSet:
+    def __init__(self, urls: dict, vnodes: int = TODO_SHARD_VNODES, engine_options=POOL_OPTIONS):
+        self.urls = dict(urls)
+        self.ring = HashRing(self.urls, vnodes) if self.urls else None
+        self.engine_options = engine_options
+        self._engines = {}
+        self._session_factories = {}
+
+    def shard_for(self, owner_id: int) -> str | None:
+        return self.ring.shard_for(owner_id) if self.ring else None
+
+    def engine(self, name: str):
+        if name not in self._engines:
+            engine = create_async_engine(self.urls[name], **self.engine_options)
+            instrument_engine(engine)
+            self._engines[name] = engine
+        return self._engines[name]
+
+    def shard_session_factory(self, name: str):
+        if name not in self._session_factories:
+            self._session_factories[name] = async_sessionmaker(
+                bind=self.engine(name), autoflush=False, expire_on_commit=False
+            )
+        return self._session_factories[name]
+
+    def session_factory(self, owner_id: int):
+        """Sessions on the owner's shard, or None when todos are not sharded."""
+        name = self.shard_for(owner_id)
+        return self.shard_session_factory(name) if name else None
+
+    async def dispose(self):
+        await asyncio.gather(*(engine.dispose() for engine in self._engines.values()))
+
+
+shard_set = ShardSet(TODO_SHARD_URLS)
+
+
+async def get_todo_db(user: Annotated[dict, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_db)]):
+    # the unsharded session is only a fallback; it takes no connection unless it is used
+    factory = shard_set.session_factory(user["user_id"]) if user else None
+    if factory is None:
+        yield db
+        return
+    async with factory() as shard_db:
+        yield shard_db
+
+
+async def get_todo_read_db(user: Annotated[dict, Depends(get_current_user)], db: Annotated[AsyncSession, Depends(get_read_db)]):
+    # shards have no replicas of their own, so sharded reads go to the owner's shard
+    factory = shard_set.session_factory(user["user_id"]) if user else None
+    if factory is None:
+        yield db
+        return
+    async with factory() as shard_db:
+        yield shard_db
+
+
+def get_todo_session_factory(user: Annotated[dict, Depends(get_current_user)], session_factory=Depends(get_session_factory)):
+    return (shard_set.session_factory(user["user_id"]) if user else None) or session_factory
+
+
+def shard_metadata():
+    """The todo tables as created on a shard: no users table, so no foreign key to it."""
+    metadata = MetaData()
+    for table in (Todos.__table__, TodoStats.__table__, TodoDeletions.__table__):
+        shard_table = table.to_metadata(metadata)
+        for constraint in list(shard_table.foreign_key_constraints):
+            shard_table.constraints.discard(constraint)
+        shard_table.foreign_keys.clear()
+        for column in shard_table.columns:
+            column.foreign_keys.clear()
+        for index in shard_table.indexes:
+            if index.dialect_options["mysql"]["prefix"] == "FULLTEXT":
+                index.ddl_if(dialect="mysql")
+    return metadata
+
+
+def create_shard_schema(connection):
+    shard_metadata().create_all(connection)
+    if connection.dialect.name == "sqlite":
+        for statement in TODOS_FTS_DDL:
+            connection.exec_driver_sql(statement)
+
+
+async def plan_moves(shards: ShardSet, owner_id: int | None = None):
+    """(owner_id, source, target) for every owner with rows off its ring shard."""
+    moves = []
+    for name in shards.urls:
+        owners = [
+            select(model.owner_id) if owner_id is None else select(model.owner_id).where(model.owner_id == owner_id)
+            for model in (Todos, TodoStats, TodoDeletions)
+        ]
+        async with shards.shard_session_factory(name)() as db:
+            result = await db.execute(owners[0].union(*owners[1:]))
+            for (owner,) in result.all():
+                target = shards.shard_for(owner)
+                if target != name:
+                    moves.append((owner, name, target))
+    return sorted(moves)
+
+
+async def move_owner(shards: ShardSet, owner_id: int, source: str, target: str) -> int:
+    """Copy an owner's todos to `target` with their ids, then delete them from `source`.
+
+    Safe to rerun after an interruption: rows already copied are recognised and skipped. The
+    deletion log moves along, taking new ids on the target; a rerun may copy it twice, which
+    only repeats deletions to syncing clients.
+    """
+    async with shards.shard_session_factory(source)() as src, shards.shard_session_factory(target)() as dst:
+        result = await src.execute(select(*Todos.__table__.columns).where(Todos.owner_id == owner_id))
+        rows = [dict(row) for row in result.mappings().all()]
+        ids = [row["id"] for row in rows]
+        copied = set()
+        for start in range(0, len(ids), MOVE_CHUNK_SIZE):
+            result = await dst.execute(
+                select(Todos.id, Todos.owner_id).where(Todos.id.in_(ids[start:start + MOVE_CHUNK_SIZE]))
+            )
+            for todo_id, existing_owner in result.all():
+                if existing_owner != owner_id:
+                    raise ShardConflict(
+                        f"todo {todo_id} of owner {owner_id} is taken by owner {existing_owner} on shard {target}"
+                    )
+                copied.add(todo_id)
+        pending = [row for row in rows if row["id"] not in copied]
+        for start in range(0, len(pending), MOVE_CHUNK_SIZE):
+            await dst.execute(insert(Todos.__table__), pending[start:start + MOVE_CHUNK_SIZE])
+        result = await src.execute(
+            select(TodoDeletions.owner_id, TodoDeletions.todo_id, TodoDeletions.deleted_at)
+            .where(TodoDeletions.owner_id == owner_id)
+        )
+        deletions = [dict(row) for row in result.mappings().all()]
+        for start in range(0, len(deletions), MOVE_CHUNK_SIZE):
+            await dst.execute(insert(TodoDeletions), deletions[start:start + MOVE_CHUNK_SIZE])
+        # the target may already hold todos written after the ring changed, so recount all of them
+        for statement in rebuild_statements(owner_id):
+            await dst.execute(statement)
+        await dst.commit()
+
+        for start in range(0, len(ids), MOVE_CHUNK_SIZE):
+            await src.execute(
+                delete(Todos).where(Todos.owner_id == owner_id, Todos.id.in_(ids[start:start + MOVE_CHUNK_SIZE]))
+            )
+        await src.execute(delete(TodoStats).where(TodoStats.owner_id == owner_id))
+        await src.execute(delete(TodoDeletions).where(TodoDeletions.owner_id == owner_id))
+        await src.commit()
+    return len(pending)
+
+
+async def rebalance(shards: ShardSet, owner_id: int | None = None, dry_run: bool = False):
+    from .routers.todos import todo_cache
+
+    moves = await plan_moves(shards, owner_id)
+    for owner, source, target in moves:
+        moved = 0 if dry_run else await move_owner(shards, owner, source, target)
+        if not dry_run:
+            # only reaches other workers through a shared cache backend; memory caches expire on their TTL
+            await todo_cache.invalidate(owner)
+        print(f"owner {owner}: {source} -> {target}" + (" (dry run)" if dry_run else f", {moved} todos copied"))
+    return moves
+
+
+async def _create_schema(shards: ShardSet):
+    for name in shards.urls:
+        async with shards.engine(name).begin() as connection:
+            await connection.run_sync(create_shard_schema)
+        print(f"created todo tables on shard {name}")
+
+
+async def _run(args):
+    try:
+        if args.command == "create-schema":
+            await _create_schema(shard_set)
+        else:
+            await rebalance(shard_set, args.owner, args.dry_run)
+    finally:
+        await shard_set.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the todo shards listed in TODO_SHARD_URLS.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create-schema", help="create the todo tables on every shard")
+    rebalance_parser = commands.add_parser("rebalance", help="move owners onto the shard the ring assigns them")
+    rebalance_parser.add_argument("--owner", type=int, default=None, help="only move this owner")
+    rebalance_parser.add_argument("--dry-run", action="store_true", help="list the moves without making them")
+    args = parser.parse_args()
+    if not shard_set.urls:
+        parser.error("TODO_SHARD_URLS is empty")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
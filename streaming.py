@@ -0,0 +1,17 @@
+import json
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EXPORT_CHUNK_SIZE = 500
+
+
+def ndjson_response(session_factory, statement, chunk_size: int = EXPORT_CHUNK_SIZE):
+    # the session is owned by the generator so it stays open while the body streams
+    async def rows():
+        async with session_factory() as db:
+            result = await db.stream(statement.execution_options(yield_per=chunk_size))
+            async for chunk in result.mappings().partitions():
+                yield "".join(json.dumps(jsonable_encoder(row)) + "\n" for row in chunk)
+
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from fastapi import HTTPException, status
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.replicas import get_read_db
+from fastapi_todo_list.database_conn import get_db
+from fastapi_todo_list.password_hashing import bcrypt_context
+from fastapi_todo_list.routers.auth import create_access_token, get_current_user, token_cache
+from fastapi_todo_list.cache import TTLCache
+from fastapi_todo_list.admission import AdmissionController, TokenBuckets, admission
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+
+
+@pytest.fixture()
+def login_user(test_user):
+    db = TestingSessionLocal()
+    user = db.get(User, test_user.id)
+    user.hashed_password = bcrypt_context.hash("password123")
+    db.commit()
+    db.close()
+    admission.clear()
+    yield test_user
+
+
+def test_login_for_access_token(login_user):
+    response = client.post("/auth/token", data={"username": "test", "password": "password123"})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["token_type"] == "bearer"
+    assert data["access_token"]
+
+
+def test_login_invalid_password(login_user):
+    response = client.post("/auth/token", data={"username": "test", "password": "wrong"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json()["detail"] == "Invalid credentials"
+
+
+def test_get_current_user_caches_verified_claims():
+    token_cache.clear()
+    token = create_access_token("test", 1, "user")
+    misses = token_cache.misses
+    hits = token_cache.hits
+
+    first = asyncio.run(get_current_user(token))
+    second = asyncio.run(get_current_user(token))
+
+    assert first == second == {"username": "test", "user_id": 1, "user_role": "user"}
+    assert token_cache.misses == misses + 1
+    assert token_cache.hits == hits + 1
+
+
+def test_get_current_user_rejects_invalid_token():
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_user("not-a-token"))
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_ttl_cache_expiry_and_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set("expired", 1, expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_login_throttled_per_username(login_user, monkeypatch):
+    monkeypatch.setattr(admission, "by_username", TokenBuckets(rate=0.01, burst=2, maxsize=100))
+    for _ in range(2):
+        response = client.post("/auth/token", data={"username": "Test", "password": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/token", data={"username": "test", "password": "password123"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+    response = client.post("/auth/token", data={"username": "someone-else", "password": "wrong"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert 'admission_rejections_total{route="login",reason="username"}' in client.get("/metrics").text
+
+
+def test_token_buckets_refill_over_time():
+    buckets = TokenBuckets(rate=2.0, burst=2, maxsize=1)
+    buckets.take("a", now=0.0)
+    buckets.take("a", now=0.0)
+    assert buckets.wait_time("a", now=0.0) == 0.5
+    assert buckets.wait_time("a", now=0.5) == 0.0
+    buckets.take("b", now=0.0)
+    # "a" was evicted and starts over with a full bucket
+    assert buckets.wait_time("a", now=0.0) == 0.0
+
+
+def test_admission_caps_concurrency():
+    controller = AdmissionController(100, 100, 100, 100, max_concurrent=1, max_tracked_keys=100)
+
+    async def nested():
+        async with controller.admit("login", "10.0.0.1"):
+            try:
+                async with controller.admit("login", "10.0.0.2"):
+                    pass
+            except HTTPException as exc:
+                return exc
+
+    exc = asyncio.run(nested())
+    assert exc.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert exc.headers["Retry-After"] == "1"
+    assert controller.in_flight == 0
@@ -0,0 +1,53 @@
+from fastapi.routing import APIRoute
+from fastapi_todo_list.benchmarks.load import UNMEASURED_ROUTES, compare, percentile, scenarios
+from fastapi_todo_list.main import app
+from fastapi_todo_list.benchmarks.startup import check, measure, parse_importtime
+
+
+def test_percentile_nearest_rank():
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.99) == 0.0
+
+
+def test_scenarios_cover_every_route():
+    routes = {f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+    covered = {name.split("?")[0] for name, _, _, _ in scenarios(users=2, todos_per_user=10, reserve=5)}
+    assert covered == routes - UNMEASURED_ROUTES
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"routes": {
+        "GET /todos/": {"p95_ms": 10.0, "throughput_rps": 1000.0},
+        "GET /users/": {"p95_ms": 10.0, "throughput_rps": 1000.0},
+    }}
+    results = {
+        "GET /todos/": {"p95_ms": 10.5, "throughput_rps": 950.0},
+        "GET /users/": {"p95_ms": 12.0, "throughput_rps": 800.0},
+        "GET /todos/stats": {"p95_ms": 99.0, "throughput_rps": 1.0},
+    }
+    regressions = compare(results, baseline, threshold=0.10)
+    assert len(regressions) == 2
+    assert all(regression.startswith("GET /users/") for regression in regressions)
+
+
+def test_parse_importtime_skips_header():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   jose.utils\n"
+        "import time:      2500 |      31875 | jose\n"
+    )
+    assert parse_importtime(output) == [("jose.utils", 120, 120), ("jose", 2500, 31875)]
+
+
+def test_cold_start_leaves_heavy_modules_unloaded():
+    sample = measure("/health/live")
+    assert sample["status"] == 200
+    assert sample["lazy_modules_loaded"] == []
+    assert check([sample], budget_ms=float("inf")) == []
+    assert check([{**sample, "lazy_modules_loaded": ["jose"]}], budget_ms=0) == [
+        f"median time to first response {sample['first_response_ms']:.1f} ms exceeds budget 0.0 ms",
+        "imported at startup but should load lazily: jose",
+    ]
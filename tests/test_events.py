@@ -0,0 +1,92 @@
+import asyncio
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.events import MemoryEventBroker, format_sse
+
+
+@pytest.fixture()
+def broker():
+    return MemoryEventBroker(buffer_size=3, max_owners=10, queue_size=10, heartbeat=0.05)
+
+
+def deleted(todo_id):
+    return {"type": "deleted", "ids": [todo_id]}
+
+
+async def collect(subscription, count):
+    """The subscription's next `count` items; "ended" for each one after it stops."""
+    return [await anext(subscription, "ended") for _ in range(count)]
+
+
+async def publish(broker, *events):
+    """Publish (owner_id, event) pairs once the tasks started before this one are waiting."""
+    await asyncio.sleep(0)
+    return [await broker.publish(owner_id, event) for owner_id, event in events]
+
+
+def test_subscriber_receives_live_events(broker):
+    created = {"type": "created", "todos": []}
+    events, ids = run_concurrently(collect(broker.subscribe(1), 2), publish(broker, (1, created), (2, deleted(9)), (1, deleted(1))))
+    assert events == [(ids[0], created), (ids[2], deleted(1))]
+
+
+def test_resume_replays_missed_events(broker):
+    first, _, _ = run_concurrently(publish(broker, (1, deleted(1)), (1, deleted(2)), (1, deleted(3))))[0]
+    (events,) = run_concurrently(collect(broker.subscribe(1, first), 2))
+    assert [event["ids"] for _, event in events] == [[2], [3]]
+
+
+@pytest.mark.parametrize("resume_from", [
+    lambda first, epoch: first,
+    lambda first, epoch: f"{epoch}-1-1",
+    lambda first, epoch: "garbage",
+], ids=["past the buffer", "before a restart", "malformed"])
+def test_resume_that_cannot_be_replayed_resets(broker, resume_from):
+    broker.buffer_size = 2
+    (ids,) = run_concurrently(publish(broker, *((1, deleted(todo_id)) for todo_id in (1, 2, 3, 4))))
+    other_process = MemoryEventBroker(buffer_size=2, max_owners=10, queue_size=10, heartbeat=0.05)
+    (events,) = run_concurrently(collect(broker.subscribe(1, resume_from(ids[0], other_process.epoch)), 1))
+    assert events == [(ids[-1], {"type": "reset"})]
+
+
+def test_resume_from_evicted_stream_resets(broker):
+    broker.max_owners = 1
+    broker.buffer_size = 10
+    (ids,) = run_concurrently(publish(
+        broker, *((1, deleted(todo_id)) for todo_id in (1, 2, 3)), (2, deleted(9)), *((1, deleted(todo_id)) for todo_id in (4, 5, 6, 7, 8))
+    ))
+    last_seen, latest = ids[2], ids[-1]
+    assert last_seen.endswith("-3") and latest.endswith("-5")
+    (events,) = run_concurrently(collect(broker.subscribe(1, last_seen), 1))
+    assert events == [(latest, {"type": "reset"})]
+
+
+def test_idle_subscriber_gets_heartbeats(broker):
+    (events,) = run_concurrently(collect(broker.subscribe(1), 1))
+    assert events == [(None, None)]
+    assert format_sse(*events[0]) == ": keepalive\n\n"
+
+
+def test_close_ends_open_streams(broker):
+    async def close():
+        await asyncio.sleep(0)
+        broker.close()
+
+    events, _ = run_concurrently(collect(broker.subscribe(1), 2), close())
+    assert events == ["ended", "ended"]
+
+
+def test_slow_subscriber_is_disconnected(broker):
+    broker.queue_size = 1
+    broker.buffer_size = 10
+    ((first,),) = run_concurrently(publish(broker, (1, deleted(1))))
+    events, _ = run_concurrently(collect(broker.subscribe(1, first), 1), publish(broker, (1, deleted(2)), (1, deleted(3))))
+    assert events == ["ended"]
+    # reconnecting from the last id the client saw picks up what was dropped
+    (replayed,) = run_concurrently(collect(broker.subscribe(1, first), 2))
+    assert [event["ids"] for _, event in replayed] == [[2], [3]]
+
+
+def test_evicted_owner_subscribers_are_disconnected(broker):
+    broker.max_owners = 1
+    events, _ = run_concurrently(collect(broker.subscribe(1), 1), publish(broker, (2, deleted(1))))
+    assert events == ["ended"]
@@ -0,0 +1,56 @@
+import asyncio
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.group_commit import GroupCommitter
+
+
+class FakeSession:
+    commits = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def commit(self):
+        FakeSession.commits.append(1)
+
+
+@pytest.fixture()
+def written():
+    FakeSession.commits = []
+    return []
+
+
+@pytest.fixture()
+def committer(written):
+    async def write(db, items):
+        written.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [f"{item}-id" for item in items]
+
+    return GroupCommitter("test", write, window_seconds=0.05, max_batch=100)
+
+
+def test_concurrent_writes_share_one_commit(committer, written):
+    assert run_concurrently(*(committer.submit(FakeSession, item) for item in "abc")) == ["a-id", "b-id", "c-id"]
+    assert written == [["a", "b", "c"]]
+    assert len(FakeSession.commits) == 1
+
+
+def test_full_batch_commits_without_waiting_for_the_window(committer, written):
+    committer.window_seconds = 60
+    committer.max_batch = 2
+    submits = (asyncio.wait_for(committer.submit(FakeSession, item), 1) for item in "ab")
+    assert run_concurrently(*submits) == ["a-id", "b-id"]
+    assert written == [["a", "b"]]
+
+
+def test_failed_batch_is_retried_one_write_at_a_time(committer, written):
+    first, bad, last = run_concurrently(*(committer.submit(FakeSession, item) for item in ("a", "bad", "c")), return_exceptions=True)
+    assert (first, last) == ("a-id", "c-id")
+    assert isinstance(bad, ValueError)
+    assert written[0] == ["a", "bad", "c"]
+    assert sorted(written[1:]) == [["a"], ["bad"], ["c"]]
+    assert len(FakeSession.commits) == 2
@@ -0,0 +1,79 @@
+import asyncio
+from fastapi import HTTPException, status
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.cache import MemoryCacheBackend
+from fastapi_todo_list.database_conn import get_db, get_session_factory
+from fastapi_todo_list.idempotency import REPLAYED_HEADER, IdempotencyStore, idempotency
+from fastapi_todo_list.replicas import get_read_db
+from fastapi_todo_list.routers import todos as todos_router
+from fastapi_todo_list.routers.auth import get_current_user
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_session_factory] = override_get_session_factory
+
+TODO_BODY = {"title": "Once", "description": "d", "priority": 1, "completed": False,
+             "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+
+
+@pytest.fixture()
+def store():
+    return IdempotencyStore(MemoryCacheBackend(100), ttl=60, lock_ttl=60, wait_seconds=1, poll_interval=0.01)
+
+
+async def handle(store, body="body", delay=0.0, error=None):
+    """One request through the store: ("ran", status) when the handler ran, ("replayed", status) otherwise."""
+    async with store.run("todos:1", "key", body) as call:
+        if call.replay is not None:
+            return "replayed", call.replay.status_code
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        call.save(status.HTTP_201_CREATED, {"id": 7})
+        return "ran", status.HTTP_201_CREATED
+
+
+def test_concurrent_duplicates_wait_for_the_first_and_replay_it(store):
+    results = run_concurrently(handle(store, delay=0.05), handle(store), handle(store))
+    assert results == [("ran", status.HTTP_201_CREATED)] + [("replayed", status.HTTP_201_CREATED)] * 2
+
+
+def test_key_reused_with_a_different_body_is_rejected(store):
+    run_concurrently(handle(store))
+    with pytest.raises(HTTPException) as error:
+        run_concurrently(handle(store, body="other body"))
+    assert error.value.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_failed_request_releases_the_key(store):
+    with pytest.raises(HTTPException):
+        run_concurrently(handle(store, error=HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)))
+    assert run_concurrently(handle(store)) == [("ran", status.HTTP_201_CREATED)]
+
+
+def test_duplicate_gives_up_while_the_first_is_still_running(store):
+    store.wait_seconds = 0.05
+    first, duplicate = run_concurrently(handle(store, delay=0.2), handle(store), return_exceptions=True)
+    assert first == ("ran", status.HTTP_201_CREATED)
+    assert duplicate.status_code == status.HTTP_409_CONFLICT
+
+
+def test_route_runs_again_after_a_failure_and_then_replays(test_todo, monkeypatch):
+    idempotency.clear()
+    insert_todos = todos_router._insert_todos
+
+    async def unavailable(db, todos):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    monkeypatch.setattr(todos_router, "_insert_todos", unavailable)
+    failed = client.post("/todos/", json=TODO_BODY, headers={"Idempotency-Key": "retry-me"})
+    assert failed.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    monkeypatch.setattr(todos_router, "_insert_todos", insert_todos)
+    created = client.post("/todos/", json=TODO_BODY, headers={"Idempotency-Key": "retry-me"})
+    replayed = client.post("/todos/", json=TODO_BODY, headers={"Idempotency-Key": "retry-me"})
+    assert created.status_code == replayed.status_code == status.HTTP_201_CREATED
+    assert REPLAYED_HEADER not in created.headers and replayed.headers[REPLAYED_HEADER] == "true"
+    assert replayed.json() == created.json()
+    assert [todo["title"] for todo in client.get("/todos/").json()].count("Once") == 1
@@ -0,0 +1,121 @@
+from fastapi import status
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.replicas import get_read_db
+from fastapi_todo_list.query_metrics import parameter_shape
+from fastapi_todo_list.database_conn import get_db
+from fastapi_todo_list.routers.auth import get_current_user
+from fastapi_todo_list.health import HealthMonitor
+import asyncio
+import time
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def test_health_check():
+    asyncio.run(health_monitor.check())
+    response = client.get("/health_check")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "healthy"}
+
+
+def test_health_ready_serves_cached_state():
+    asyncio.run(health_monitor.check())
+    response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["ping_ms"] is not None
+
+    health_monitor.state["checked_at"] = time.time() - 10 * health_monitor.interval
+    response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["reason"] == "health check stale"
+    assert client.get("/health_check").status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    asyncio.run(health_monitor.check())
+
+
+def test_health_live():
+    assert client.get("/health/live").status_code == status.HTTP_200_OK
+
+
+def test_health_monitor_reports_saturated_pool_and_unreachable_database():
+    async def saturated():
+        engine = create_async_engine(ASYNC_SQLITE_DATABASE_URL, pool_size=1, max_overflow=0)
+        monitor = HealthMonitor(engine)
+        try:
+            async with engine.connect():
+                return await monitor.check()
+        finally:
+            await engine.dispose()
+
+    state = asyncio.run(saturated())
+    assert state["ready"] is False
+    assert state["reason"] == "connection pool saturated"
+    assert state["pool_utilisation"] == 1.0
+
+    async def refused():
+        raise ConnectionRefusedError()
+
+    async def hanging():
+        await asyncio.sleep(1)
+
+    monitor = HealthMonitor(async_engine, timeout=0.01)
+    monitor._ping = refused
+    state = asyncio.run(monitor.check())
+    assert state["ready"] is False
+    assert state["reason"] == "database unavailable: ConnectionRefusedError"
+    monitor._ping = hanging
+    assert asyncio.run(monitor.check())["reason"] == "database ping timed out"
+
+
+def test_pool_stats():
+    response = client.get("/pool_stats")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    for key in ("pool_size", "checked_out", "overflow", "wait_seconds_total", "checkout_latency_seconds"):
+        assert key in data
+    assert "+Inf" in data["checkout_latency_seconds"]
+
+
+def test_metrics_labels_requests_by_route_template():
+    client.get("/health_check")
+    client.get("/users/999999")
+    client.get("/no-such-route")
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/health_check",status="200"}' in body
+    assert 'route="/users/{user_id}"' in body
+    assert 'route="/users/999999"' not in body
+    assert 'route="<unmatched>",status="404"' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health_check",le="+Inf"}' in body
+    assert "# TYPE http_requests_in_progress gauge" in body
+    assert "db_pool_checkout_seconds_count" in body
+    assert "# TYPE token_cache_lookups_total counter" in body
+    assert 'token_cache_lookups_total{result="hit"}' in body
+
+
+def test_query_stats_headers_and_metrics(test_user):
+    response = client.get(f"/users/{test_user.id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert int(response.headers["X-DB-Query-Count"]) == 1
+    assert float(response.headers["X-DB-Time-Ms"]) > 0
+    assert client.get("/health_check").headers["X-DB-Query-Count"] == "0"
+    body = client.get("/metrics").text
+    assert 'db_queries_total{operation="SELECT"}' in body
+    assert 'http_request_db_queries_bucket{method="GET",route="/users/{user_id}",le="1"}' in body
+
+
+def test_slow_query_log_reports_parameter_shapes(caplog):
+    slow_engine = create_engine("sqlite://")
+    instrument_engine(slow_engine, slow_query_seconds=0)
+    with caplog.at_level("WARNING", logger="fastapi_todo_list.query_metrics"):
+        with slow_engine.connect() as connection:
+            connection.execute(text("SELECT :name, :count"), {"name": "secret", "count": 3})
+    assert "slow query" in caplog.text
+    assert "params=(str, int)" in caplog.text
+    assert "secret" not in caplog.text
+    assert parameter_shape([(1, "a"), (2, "b")], executemany=True) == "2 x (int, str)"
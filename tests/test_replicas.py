@@ -0,0 +1,84 @@
+import asyncio
+from fastapi import status
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list import replicas
+from fastapi_todo_list.database_conn import get_db
+from fastapi_todo_list.replicas import ReplicaSet, get_read_db
+from fastapi_todo_list.password_hashing import bcrypt_context
+from fastapi_todo_list.routers.auth import create_access_token, get_current_user
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture()
+def replica_set(test_user, tmp_path, monkeypatch):
+    urls = []
+    for name in ("replica1", "replica2"):
+        replica_engine = create_engine(f"sqlite:///{tmp_path}/{name}.db")
+        Base.metadata.create_all(bind=replica_engine)
+        with replica_engine.begin() as connection:
+            connection.execute(User.__table__.insert().values(
+                id=test_user.id, username="test", first_name=name, last_name="test",
+                email="test@test.com", hashed_password="test", role="user", is_active=True,
+            ))
+        replica_engine.dispose()
+        urls.append(f"sqlite+aiosqlite:///{tmp_path}/{name}.db")
+
+    replica_set = ReplicaSet(urls, window_seconds=60, maxsize=100, primary=lambda: async_engine,
+                             engine_options={"poolclass": NullPool})
+    for replica in replica_set.replicas:
+        asyncio.run(replica.monitor.check())
+
+    async def override_get_read_db():
+        async with replica_set.session_factory() as db:
+            yield db
+
+    # authenticate for real so get_current_user names the user for read-your-writes
+    monkeypatch.delitem(app.dependency_overrides, get_current_user)
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, override_get_read_db)
+    monkeypatch.setattr(replicas, "replica_set", replica_set)
+    yield replica_set
+    for replica in replica_set.replicas:
+        asyncio.run(replica.engine.dispose())
+
+
+def read_first_name(user_id):
+    token = create_access_token("test", user_id, "user")
+    response = client.get(f"/users/{user_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()["first_name"]
+
+
+def test_reads_round_robin_across_replicas(replica_set, test_user):
+    assert {read_first_name(test_user.id) for _ in range(4)} == {"replica1", "replica2"}
+
+
+def test_reads_fall_back_to_primary_when_replicas_unhealthy(replica_set, test_user):
+    replica_set.replicas[0].monitor.state["ready"] = False
+    assert {read_first_name(test_user.id) for _ in range(3)} == {"replica2"}
+    replica_set.replicas[1].monitor.state["ready"] = False
+    assert read_first_name(test_user.id) == "test"
+
+
+def test_write_pins_the_writers_reads_to_primary(replica_set, test_user):
+    token = create_access_token("test", test_user.id, "user")
+    response = client.put(f"/users/{test_user.id}", headers={"Authorization": f"Bearer {token}"}, json={
+        "username": "test", "first_name": "updated", "last_name": "test", "email": "test@test.com",
+        "role": "user", "hashed_password": "password123", "is_active": True,
+    })
+    assert response.status_code == status.HTTP_200_OK
+    assert {read_first_name(test_user.id) for _ in range(3)} == {"updated"}
+    # other users still read from the replicas
+    assert replica_set.choose(key=test_user.id + 1) is not async_engine
+
+
+def test_login_finds_account_missing_from_replicas(replica_set):
+    db = TestingSessionLocal()
+    db.add(User(username="fresh", first_name="fresh", last_name="fresh", email="fresh@test.com",
+                hashed_password=bcrypt_context.hash("password123"), role="user", is_active=True))
+    db.commit()
+    db.close()
+    response = client.post("/auth/token", data={"username": "fresh", "password": "password123"})
+    assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,155 @@
+import asyncio
+from collections import Counter
+from fastapi import status
+from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list import sharding
+from fastapi_todo_list.database_conn import get_db, get_session_factory
+from fastapi_todo_list.replicas import get_read_db
+from fastapi_todo_list.routers.auth import get_current_user
+from fastapi_todo_list.models import TodoDeletions, TodoStats
+from fastapi_todo_list.sharding import HashRing, ShardConflict, ShardSet, create_shard_schema, rebalance
+from fastapi_todo_list.todo_changes import prune_shards
+from fastapi_todo_list.todo_stats import rebuild_shards, rebuild_statements
+from sqlalchemy import func, insert, select
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_session_factory] = override_get_session_factory
+
+TODO_BODY = {"title": "Sharded", "description": "Sharded", "priority": 2, "completed": False,
+             "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+
+
+@pytest.fixture()
+def shard_files(tmp_path):
+    engines = {}
+    for name in ("a", "b", "c"):
+        engines[name] = create_engine(f"sqlite:///{tmp_path}/{name}.db")
+        with engines[name].begin() as connection:
+            create_shard_schema(connection)
+    yield {name: f"sqlite+aiosqlite:///{tmp_path}/{name}.db" for name in engines}, engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+def make_shards(urls, *names):
+    return ShardSet({name: urls[name] for name in names}, engine_options={"poolclass": NullPool})
+
+
+def owners_on(engine):
+    with engine.connect() as connection:
+        return {row[0]: row[1] for row in connection.execute(
+            select(Todos.owner_id, func.count()).group_by(Todos.owner_id)
+        )}
+
+
+def test_hash_ring_spreads_owners_and_only_moves_them_onto_new_shards():
+    ring = HashRing(["a", "b", "c"])
+    placement = {owner_id: ring.shard_for(owner_id) for owner_id in range(3000)}
+    assert all(count > 700 for count in Counter(placement.values()).values())
+    grown = HashRing(["a", "b", "c", "d"])
+    for owner_id, shard in placement.items():
+        assert grown.shard_for(owner_id) in (shard, "d")
+    assert HashRing(["a", "b", "c"]).shard_for(42) == placement[42]
+
+
+def test_todo_routes_use_the_owners_shard(shard_files, monkeypatch):
+    urls, engines = shard_files
+    shards = make_shards(urls, "a", "b", "c")
+    monkeypatch.setattr(sharding, "shard_set", shards)
+    todo_cache.backend.clear()
+
+    response = client.post("/todos/", json=TODO_BODY)
+    assert response.status_code == status.HTTP_201_CREATED
+    home = shards.shard_for(1)
+    assert owners_on(engines[home]) == {1: 1}
+    assert all(owners_on(engine) == {} for name, engine in engines.items() if name != home)
+
+    response = client.get("/todos/")
+    assert [todo["title"] for todo in response.json()] == ["Sharded"]
+    assert client.get("/todos/stats").json()["open"] == 1
+    assert client.get("/todos/export").text.count("\n") == 1
+    asyncio.run(shards.dispose())
+    todo_cache.backend.clear()
+
+
+def test_rebalance_moves_owners_to_their_ring_shard(shard_files):
+    urls, engines = shard_files
+    with engines["a"].begin() as connection:
+        connection.execute(insert(Todos), [
+            {"id": owner_id * 10 + n, "title": "t", "description": "d", "priority": n, "completed": n == 0, "owner_id": owner_id}
+            for owner_id in range(1, 21) for n in range(2)
+        ])
+        connection.execute(insert(TodoDeletions), [{"owner_id": owner_id, "todo_id": owner_id * 10 + 9} for owner_id in range(1, 21)])
+        for statement in rebuild_statements():
+            connection.execute(statement)
+
+    shards = make_shards(urls, "a", "b")
+    moves = asyncio.run(rebalance(shards))
+    assert moves and all(source == "a" and target == "b" for _, source, target in moves)
+    moved = {owner_id for owner_id, _, _ in moves}
+    assert set(owners_on(engines["b"])) == moved
+    assert set(owners_on(engines["a"])) == set(range(1, 21)) - moved
+    owner_id = min(moved)
+    with engines["b"].connect() as connection:
+        assert connection.execute(select(Todos.id).where(Todos.owner_id == owner_id).order_by(Todos.id)).scalars().all() == [owner_id * 10, owner_id * 10 + 1]
+        assert connection.execute(select(func.sum(TodoStats.open_count)).where(TodoStats.owner_id == owner_id)).scalar() == 1
+        assert connection.execute(select(TodoDeletions.todo_id).where(TodoDeletions.owner_id == owner_id)).scalars().all() == [owner_id * 10 + 9]
+    with engines["a"].connect() as connection:
+        assert connection.execute(select(TodoStats).where(TodoStats.owner_id == owner_id)).first() is None
+        assert connection.execute(select(TodoDeletions).where(TodoDeletions.owner_id == owner_id)).first() is None
+    assert asyncio.run(rebalance(shards)) == []
+    asyncio.run(shards.dispose())
+
+
+def test_rebalance_stops_on_id_conflict(shard_files):
+    urls, engines = shard_files
+    shards = make_shards(urls, "a", "b")
+    owner_id = next(owner for owner in range(1, 100) if shards.shard_for(owner) == "b")
+    with engines["a"].begin() as connection:
+        connection.execute(insert(Todos).values(id=5, title="t", description="d", priority=1, completed=False, owner_id=owner_id))
+    with engines["b"].begin() as connection:
+        connection.execute(insert(Todos).values(id=5, title="other", description="d", priority=1, completed=False, owner_id=owner_id + 1000))
+
+    with pytest.raises(ShardConflict):
+        asyncio.run(rebalance(shards, owner_id=owner_id))
+    assert owners_on(engines["a"]) == {owner_id: 1}
+    asyncio.run(shards.dispose())
+
+
+def test_prune_shards_trims_every_shards_deletion_log(shard_files):
+    urls, engines = shard_files
+    old, recent = datetime(2000, 1, 1), datetime.now()
+    for name in ("a", "b"):
+        with engines[name].begin() as connection:
+            connection.execute(insert(TodoDeletions), [
+                {"owner_id": 1, "todo_id": 1, "deleted_at": old},
+                {"owner_id": 1, "todo_id": 2, "deleted_at": recent},
+            ])
+
+    shards = make_shards(urls, "a", "b")
+    assert asyncio.run(prune_shards(shards, days=30)) == {"a": 1, "b": 1}
+    for name in ("a", "b"):
+        with engines[name].connect() as connection:
+            assert connection.execute(select(TodoDeletions.todo_id)).scalars().all() == [2]
+    asyncio.run(shards.dispose())
+
+
+def test_rebuild_shards_repairs_every_shards_counters(shard_files):
+    urls, engines = shard_files
+    for name, owner_id in (("a", 1), ("b", 2)):
+        with engines[name].begin() as connection:
+            connection.execute(insert(Todos), [
+                {"id": owner_id * 10 + n, "title": "t", "description": "d", "priority": 2, "completed": n == 0, "owner_id": owner_id}
+                for n in range(3)
+            ])
+            connection.execute(insert(TodoStats), [{"owner_id": owner_id, "priority": 2, "open_count": 7, "completed_count": 0}])
+
+    shards = make_shards(urls, "a", "b")
+    asyncio.run(rebuild_shards(shards))
+    for name, owner_id in (("a", 1), ("b", 2)):
+        with engines[name].connect() as connection:
+            stats = connection.execute(select(TodoStats.owner_id, TodoStats.priority, TodoStats.open_count, TodoStats.completed_count)).all()
+            assert [tuple(row) for row in stats] == [(owner_id, 2, 2, 1)]
+    asyncio.run(shards.dispose())
@@ -1,12 +1,27 @@
+import json
 from fastapi.testclient import TestClient
 from fastapi import status
 from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.replicas import get_read_db
 from fastapi_todo_list.routers.todos import get_db, db_dependency, user_dependency
+from fastapi_todo_list.database_conn import get_session_factory
 from fastapi_todo_list.routers.auth import get_current_user
-from fastapi_todo_list.models import Todos
+from fastapi_todo_list.models import Todos, TodoStats
+from fastapi_todo_list.todo_stats import rebuild_todo_stats
+from fastapi_todo_list import todo_changes
+from fastapi_todo_list.events import MemoryEventBroker
+from fastapi_todo_list.idempotency import REPLAYED_HEADER, idempotency
+from fastapi_todo_list import replicas
+from sqlalchemy import update
+from sqlalchemy.dialects import mysql
+from datetime import timezone
+from fastapi_todo_list.routers import todos as todos_router
+from fastapi_todo_list.routers.todos import todo_group_commit
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_session_factory] = override_get_session_factory
 
 def test_get_todos(test_todo):
     response = client.get("/todos/")
@@ -58,3 +73,479 @@ def test_delete_todo(test_todo):
     assert data["message"] == "Todo deleted successfully"
 
 
+def test_get_todos_keyset_pagination(test_todo):
+    db = TestingSessionLocal()
+    for i in range(4):
+        db.add(Todos(title=f"Todo {i}", description="Paged", priority=1, completed=False, owner_id=1))
+    db.commit()
+    db.close()
+
+    response = client.get("/todos/", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    first_page = response.json()
+    assert len(first_page) == 2
+    assert first_page[0]["id"] == test_todo.id
+    cursor = response.headers["X-Next-Cursor"]
+    assert cursor == str(first_page[-1]["id"])
+
+    response = client.get("/todos/", params={"limit": 2, "after": cursor})
+    second_page = response.json()
+    assert len(second_page) == 2
+    assert second_page[0]["id"] > first_page[-1]["id"]
+
+    response = client.get("/todos/", params={"limit": 2, "after": response.headers["X-Next-Cursor"]})
+    assert len(response.json()) == 1
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_export_todos_ndjson(test_todo):
+    response = client.get("/todos/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["id"] == test_todo.id
+    assert lines[0]["title"] == test_todo.title
+
+
+def test_bulk_create_todos(test_todo):
+    todo_requests = [
+        {"title": f"Bulk {i}", "description": "Bulk Description", "priority": i, "completed": False, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+        for i in range(3)
+    ]
+    response = client.post("/todos/bulk", json=todo_requests)
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created"] * 3
+
+    db = TestingSessionLocal()
+    created = db.query(Todos).filter(Todos.id.in_([result["id"] for result in results])).order_by(Todos.id).all()
+    assert [todo.title for todo in created] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+    assert all(todo.owner_id == 1 for todo in created)
+    db.close()
+
+
+def test_bulk_update_todos(test_todo):
+    response = client.patch("/todos/bulk", json=[
+        {"id": test_todo.id, "title": "Bulk Updated", "completed": True},
+        {"id": 999999, "title": "Missing"},
+    ])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["results"] == [
+        {"id": test_todo.id, "status": "updated"},
+        {"id": 999999, "status": "not_found"},
+    ]
+
+    db = TestingSessionLocal()
+    todo = db.query(Todos).filter(Todos.id == test_todo.id).first()
+    assert todo.title == "Bulk Updated"
+    assert todo.completed == True
+    assert todo.description == test_todo.description
+    db.close()
+
+
+def test_bulk_delete_todos(test_todo):
+    response = client.request("DELETE", "/todos/bulk", json=[test_todo.id, 999999])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["results"] == [
+        {"id": test_todo.id, "status": "deleted"},
+        {"id": 999999, "status": "not_found"},
+    ]
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).filter(Todos.id == test_todo.id).first() is None
+    db.close()
+
+
+def test_bulk_create_rejects_empty_batch(test_todo):
+    response = client.post("/todos/bulk", json=[])
+    assert response.status_code == 422
+
+
+def test_get_todos_served_from_cache_until_write(test_todo):
+    assert len(client.get("/todos/").json()) == 1
+
+    # a row written behind the API's back is not visible while the cached page is valid
+    db = TestingSessionLocal()
+    db.add(Todos(title="Out of band", description="Direct insert", priority=1, completed=False, owner_id=1))
+    db.commit()
+    db.close()
+    assert len(client.get("/todos/").json()) == 1
+
+    response = client.post("/todos/", json={"title": "Via API", "description": "Invalidates", "priority": 1, "completed": False, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(client.get("/todos/").json()) == 3
+
+
+def test_get_todo_cache_invalidated_by_update(test_todo):
+    assert client.get(f"/todos/{test_todo.id}").json()["title"] == "Test Todo"
+    client.put(f"/todos/{test_todo.id}", json={"title": "Updated Todo", "description": "Updated Description", "priority": 2, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    assert client.get(f"/todos/{test_todo.id}").json()["title"] == "Updated Todo"
+
+
+def test_cache_hits_return_the_encoded_body(test_todo, monkeypatch):
+    first_list = client.get("/todos/")
+    first_item = client.get(f"/todos/{test_todo.id}")
+
+    def reencoded(*args, **kwargs):
+        raise AssertionError("cache hit was validated and serialized again")
+
+    monkeypatch.setattr(todos_router.todo_list_adapter, "validate_python", reencoded)
+    monkeypatch.setattr(todos_router.TodoResponse, "model_validate", reencoded)
+    monkeypatch.setattr(todos_router.TodoResponse, "model_dump", reencoded)
+    cached_list = client.get("/todos/")
+    cached_item = client.get(f"/todos/{test_todo.id}")
+    assert cached_list.content == first_list.content
+    assert cached_list.headers["ETag"] == first_list.headers["ETag"]
+    assert cached_list.headers["content-type"] == "application/json"
+    assert cached_item.json() == first_item.json()
+
+
+def test_get_todos_conditional_get(test_todo):
+    response = client.get("/todos/")
+    etag = response.headers["ETag"]
+
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    # the ETag is also checked when the page is not cached
+    todo_cache.backend.clear()
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.delete(f"/todos/{test_todo.id}")
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+
+
+def test_get_todos_etag_changes_when_updated_at_does_not(test_todo):
+    body = {"title": "First", "description": "Test Description", "priority": 1, "completed": False,
+            "created_at": "2024-01-01T00:00:00", "updated_at": "2000-01-01T00:00:00"}
+    client.put(f"/todos/{test_todo.id}", json=body)
+    etag = client.get("/todos/").headers["ETag"]
+
+    client.put(f"/todos/{test_todo.id}", json={**body, "title": "Second"})
+    todo_cache.backend.clear()
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["title"] == "Second"
+
+
+def test_update_todo_not_found(test_todo):
+    response = client.put("/todos/999999", json={"title": "Updated Todo", "description": "Updated Description", "priority": 2, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Todo not found"
+
+
+def test_update_todo_of_other_owner_not_found(test_todo):
+    db = TestingSessionLocal()
+    other = Todos(title="Other", description="Other owner", priority=1, completed=False, owner_id=2)
+    db.add(other)
+    db.commit()
+    other_id = other.id
+    db.close()
+
+    response = client.put(f"/todos/{other_id}", json={"title": "Hijacked", "description": "Hijacked", "priority": 2, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = client.delete(f"/todos/{other_id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_todo_routes_without_returning_support(test_todo, monkeypatch):
+    # MySQL has neither UPDATE nor DELETE ... RETURNING
+    monkeypatch.setattr(async_engine.dialect, "update_returning", False)
+    monkeypatch.setattr(async_engine.dialect, "delete_returning", False)
+    # the locking read, the update and the stats upsert
+    with assert_max_queries(3):
+        response = client.put(f"/todos/{test_todo.id}", json={"title": "Fallback", "description": "Updated Description", "priority": 2, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Fallback"
+    assert client.get(f"/todos/{test_todo.id}").json()["completed"] is True
+    # the locking read, the delete, the stats upsert and the todo_deletions entry
+    with assert_max_queries(4):
+        assert client.delete(f"/todos/{test_todo.id}").status_code == status.HTTP_200_OK
+
+
+def test_delete_todo_not_found(test_todo):
+    response = client.delete("/todos/999999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Todo not found"
+
+
+@pytest.fixture()
+def filter_todos(test_todo):
+    db = TestingSessionLocal()
+    todos = [
+        Todos(title="Buy milk", description="Groceries for the week", priority=3, completed=False, owner_id=1),
+        Todos(title="Write report", description="Quarterly numbers", priority=5, completed=True, owner_id=1),
+        Todos(title="Call plumber", description="Kitchen sink leaks", priority=5, completed=False, owner_id=1),
+        Todos(title="Buy milk", description="Someone else's list", priority=3, completed=False, owner_id=2),
+    ]
+    db.add_all(todos)
+    db.commit()
+    ids = {todo.title: todo.id for todo in todos if todo.owner_id == 1}
+    db.close()
+    yield ids
+
+
+def test_get_todos_filters(filter_todos):
+    response = client.get("/todos/", params={"completed": True})
+    assert [todo["title"] for todo in response.json()] == ["Write report"]
+
+    response = client.get("/todos/", params={"priority_min": 3, "priority_max": 4})
+    assert [todo["title"] for todo in response.json()] == ["Buy milk"]
+
+    response = client.get("/todos/", params={"q": "plumb"})
+    assert [todo["title"] for todo in response.json()] == ["Call plumber"]
+
+    response = client.get("/todos/", params={"q": "groceries week"})
+    assert [todo["title"] for todo in response.json()] == ["Buy milk"]
+
+    response = client.get("/todos/", params={"q": '"plumb!'})
+    assert [todo["title"] for todo in response.json()] == ["Call plumber"]
+
+    response = client.get("/todos/", params={"q": '"*'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+
+def test_text_search_mysql_matches_word_prefixes():
+    condition = todos_router._text_search("mysql", 'plumb "week+')
+    assert condition.compile(dialect=mysql.dialect()).params["param_1"] == "+plumb* +week*"
+
+
+def test_get_todos_sorted_keyset_pagination(filter_todos):
+    seen = []
+    params = {"sort": "-priority", "limit": 2}
+    while True:
+        response = client.get("/todos/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend((todo["priority"], todo["id"]) for todo in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after"] = response.headers["X-Next-Cursor"]
+    assert seen == sorted(seen, key=lambda item: (-item[0], -item[1]))
+    assert len(seen) == 4
+
+
+def test_get_todos_invalid_cursor(filter_todos):
+    response = client.get("/todos/", params={"sort": "priority", "after": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def _stats():
+    return client.get("/todos/stats").json()
+
+
+def test_todo_stats_follow_writes(test_todo):
+    db = TestingSessionLocal()
+    rebuild_todo_stats(db)
+    db.close()
+    assert _stats() == {"open": 1, "completed": 0, "total": 1, "by_priority": [{"priority": 1, "open": 1, "completed": 0}]}
+
+    response = client.post("/todos/", json={"title": "New", "description": "New", "priority": 2, "completed": False, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    new_id = response.json()["id"]
+    client.put(f"/todos/{test_todo.id}", json={"title": "Done", "description": "Done", "priority": 2, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+    assert _stats() == {"open": 1, "completed": 1, "total": 2, "by_priority": [{"priority": 2, "open": 1, "completed": 1}]}
+
+    client.patch("/todos/bulk", json=[{"id": new_id, "priority": 3}])
+    client.post("/todos/bulk", json=[{"title": "Bulk", "description": "Bulk", "priority": 3, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}])
+    assert _stats() == {"open": 1, "completed": 2, "total": 3, "by_priority": [
+        {"priority": 2, "open": 0, "completed": 1},
+        {"priority": 3, "open": 1, "completed": 1},
+    ]}
+
+    client.delete(f"/todos/{test_todo.id}")
+    client.request("DELETE", "/todos/bulk", json=[new_id])
+    assert _stats() == {"open": 0, "completed": 1, "total": 1, "by_priority": [{"priority": 3, "open": 0, "completed": 1}]}
+
+
+def test_rebuild_todo_stats_repairs_drift(test_todo):
+    db = TestingSessionLocal()
+    db.query(TodoStats).delete()
+    db.add(TodoStats(owner_id=1, priority=1, open_count=42, completed_count=7))
+    db.commit()
+    rebuild_todo_stats(db, owner_id=1)
+    stats = db.query(TodoStats).filter(TodoStats.owner_id == 1).all()
+    assert [(row.priority, row.open_count, row.completed_count) for row in stats] == [(1, 1, 0)]
+    db.close()
+
+
+def test_todo_routes_query_budget(test_todo):
+    body = {"title": "Budget", "description": "Budget", "priority": 2, "completed": True, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+    with assert_max_queries(2):
+        assert client.get("/todos/").status_code == status.HTTP_200_OK
+    with assert_max_queries(0):
+        assert client.get("/todos/").status_code == status.HTTP_200_OK
+    with assert_max_queries(1):
+        assert client.get(f"/todos/{test_todo.id}").status_code == status.HTTP_200_OK
+    with assert_max_queries(2):
+        assert client.post("/todos/", json=body).status_code == status.HTTP_201_CREATED
+    with assert_max_queries(3):
+        assert client.put(f"/todos/{test_todo.id}", json=body).status_code == status.HTTP_200_OK
+    # the delete, the stats upsert and the todo_deletions entry
+    with assert_max_queries(3):
+        assert client.delete(f"/todos/{test_todo.id}").status_code == status.HTTP_200_OK
+
+
+def _events(response):
+    events = []
+    for block in response.text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(("retry:", ":")))
+        if fields:
+            events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_todo_events_resume_from_last_event_id(test_todo, monkeypatch):
+    broker = MemoryEventBroker(buffer_size=100, max_owners=10, queue_size=10, heartbeat=15)
+    monkeypatch.setattr(todos_router, "todo_events", broker)
+    payload = {"title": "Evented", "description": "d", "priority": 3, "completed": False,
+               "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+    created = client.post("/todos/", json=payload).json()
+    client.put(f"/todos/{created['id']}", json={**payload, "completed": True})
+    client.patch("/todos/bulk", json=[{"id": test_todo.id, "priority": 1}])
+    client.delete(f"/todos/{created['id']}")
+    # after close the stream ends once the replay is written, so the test client can read it
+    broker.close()
+
+    response = client.get("/todos/events", headers={"Last-Event-ID": f"{broker.epoch}-1-0"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("retry: ")
+    events = _events(response)
+    assert [event_type for _, event_type, _ in events] == ["created", "updated", "updated", "deleted"]
+    assert events[0][2]["todos"][0]["id"] == created["id"]
+    assert events[1][2]["todos"][0]["completed"] is True
+    assert events[2][2]["todos"] == [client.get(f"/todos/{test_todo.id}").json()]
+    assert events[2][2]["todos"][0]["priority"] == 1
+    assert events[3][2]["ids"] == [created["id"]]
+
+    response = client.get("/todos/events", headers={"Last-Event-ID": events[1][0]})
+    assert [event_id for event_id, _, _ in _events(response)] == [events[2][0], events[3][0]]
+
+    response = client.get("/todos/events", headers={"Last-Event-ID": "stale-1"})
+    assert _events(response) == [(events[3][0], "reset", {"type": "reset"})]
+
+
+def _sync(since=None, **params):
+    response = client.get("/todos/changes", params={**params, **({"since": since} if since else {})})
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+@pytest.fixture()
+def settled_changes(monkeypatch):
+    # every committed change counts as settled, so each delta holds exactly the changes since the last
+    monkeypatch.setattr(todo_changes, "TODO_CHANGES_SETTLE_SECONDS", 0)
+
+
+def test_todo_changes_delta_sync(test_todo, settled_changes):
+    payload = {"title": "Synced", "description": "d", "priority": 2, "completed": False,
+               "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-02T00:00:00"}
+    full = _sync()
+    assert [todo["id"] for todo in full["todos"]] == [test_todo.id]
+    assert full["deleted"] == [] and full["has_more"] is False
+
+    created = client.post("/todos/", json=payload).json()
+    delta = _sync(full["next_cursor"])
+    assert [todo["id"] for todo in delta["todos"]] == [created["id"]]
+
+    client.put(f"/todos/{test_todo.id}", json={**payload, "title": "Renamed"})
+    client.delete(f"/todos/{created['id']}")
+    delta = _sync(delta["next_cursor"])
+    assert [todo["title"] for todo in delta["todos"]] == ["Renamed"]
+    assert delta["deleted"] == [created["id"]]
+
+    client.request("DELETE", "/todos/bulk", json=[test_todo.id])
+    delta = _sync(delta["next_cursor"])
+    assert delta["todos"] == []
+    assert delta["deleted"] == [test_todo.id]
+
+
+def test_todo_changes_resends_unsettled_changes(test_todo):
+    full = _sync()
+    stamped_first = datetime.now(timezone.utc)
+    created = client.post("/todos/", json={"title": "Fast", "description": "d", "priority": 2, "completed": False,
+                                               "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}).json()
+    delta = _sync(full["next_cursor"])
+    assert created["id"] in [todo["id"] for todo in delta["todos"]]
+
+    # a slower transaction that stamped changed_at before the create commits only now
+    db = TestingSessionLocal()
+    db.execute(update(Todos).where(Todos.id == test_todo.id).values(title="Slow", changed_at=stamped_first))
+    db.commit()
+    db.close()
+    delta = _sync(delta["next_cursor"])
+    assert [todo["title"] for todo in delta["todos"]] == ["Slow", "Fast"]
+
+
+def test_todo_changes_sees_writes_with_older_updated_at(test_todo, settled_changes):
+    # an offline device sends the updated_at of when the edit was made, long before this sync
+    stale = {"title": "Offline edit", "description": "d", "priority": 2, "completed": False,
+             "created_at": "2000-01-01T00:00:00", "updated_at": "2000-01-01T00:00:00"}
+    full = _sync()
+    client.put(f"/todos/{test_todo.id}", json=stale)
+    client.post("/todos/", json={**stale, "title": "Backdated"})
+    delta = _sync(full["next_cursor"])
+    assert [todo["title"] for todo in delta["todos"]] == ["Offline edit", "Backdated"]
+
+    client.patch("/todos/bulk", json=[{"id": test_todo.id, "priority": 5, "updated_at": "2000-01-01T00:00:00"}])
+    delta = _sync(delta["next_cursor"])
+    assert delta["todos"][-1]["id"] == test_todo.id and delta["todos"][-1]["priority"] == 5
+
+
+def test_todo_changes_pages_through_a_burst(test_todo, settled_changes):
+    payload = {"title": "Burst", "description": "d", "priority": 1, "completed": False,
+               "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-03T00:00:00"}
+    full = _sync()
+    client.post("/todos/bulk", json=[payload] * 5)
+    seen, cursor = [], full["next_cursor"]
+    while True:
+        page = _sync(cursor, limit=2)
+        seen += [todo["id"] for todo in page["todos"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    assert len(seen) == len(set(seen))
+    assert len(set(seen) - {test_todo.id}) == 5
+
+
+def test_todo_changes_rejects_bad_and_expired_cursors(test_todo, monkeypatch):
+    assert client.get("/todos/changes", params={"since": "not-a-cursor"}).status_code == status.HTTP_400_BAD_REQUEST
+    cursor = _sync()["next_cursor"]
+    monkeypatch.setattr(todo_changes, "TODO_DELETIONS_RETENTION_DAYS", 0)
+    assert client.get("/todos/changes", params={"since": cursor}).status_code == status.HTTP_410_GONE
+
+
+def test_create_todo_idempotency_key_replays(test_todo):
+    idempotency.clear()
+    body = {"title": "Once", "description": "d", "priority": 1, "completed": False,
+            "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+    first = client.post("/todos/", json=body, headers={"Idempotency-Key": "create-once"})
+    retry = client.post("/todos/", json=body, headers={"Idempotency-Key": "create-once"})
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry.json() == first.json()
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert [todo["title"] for todo in client.get("/todos/").json()].count("Once") == 1
+
+    reused = client.post("/todos/", json={**body, "title": "Twice"}, headers={"Idempotency-Key": "create-once"})
+    assert reused.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_create_todo_group_commit(test_todo, monkeypatch):
+    monkeypatch.setattr(todo_group_commit, "enabled", True)
+    marked = []
+    monkeypatch.setattr(replicas.replica_set, "mark_write", marked.append)
+    body = {"title": "Grouped", "description": "d", "priority": 4, "completed": False,
+            "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"}
+    response = client.post("/todos/", json=body)
+    assert response.status_code == status.HTTP_201_CREATED
+    created = response.json()
+    assert created["id"] != test_todo.id and created["title"] == "Grouped"
+    assert marked == [test_todo.owner_id]
+    assert client.get(f"/todos/{created['id']}").json()["priority"] == 4
+    assert any(item["priority"] == 4 and item["open"] == 1 for item in client.get("/todos/stats").json()["by_priority"])
@@ -1,12 +1,19 @@
+import json
 import pytest
 from fastapi_todo_list.tests.utils import *
+from fastapi_todo_list.replicas import get_read_db
 from fastapi_todo_list.models import User
 from starlette import status
 from fastapi_todo_list.routers.users import get_db, db_dependency, user_dependency
+from fastapi_todo_list.database_conn import get_session_factory
 from fastapi_todo_list.routers.auth import get_current_user
+from fastapi_todo_list.password_hashing import password_hasher, bcrypt_context
+from fastapi_todo_list.idempotency import idempotency
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_session_factory] = override_get_session_factory
 
 def test_get_users(test_user):
     response = client.get("/users/")
@@ -16,9 +23,9 @@ def test_get_users(test_user):
     assert len(data) == 1
     user_data = data[0]
     
+    assert "hashed_password" not in user_data
     user_data.pop("created_at")
     user_data.pop("updated_at")
-    user_data.pop("hashed_password")
     
     expected = {
         "id": test_user.id,
@@ -59,9 +66,27 @@ def test_create_user(test_user):
     assert created.role == user_request.get("role")
     assert created.is_active == user_request.get("is_active")
     assert created.phone_number == user_request.get("phone_number")
+    assert bcrypt_context.verify(user_request.get("hashed_password"), created.hashed_password)
     db.close()
 
 
+def test_create_user_hash_queue_full(test_user, monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    user_request = {
+        "username": "newuser",
+        "first_name": "test",
+        "last_name": "test",
+        "email": "newuser@test.com",
+        "role": "user",
+        "hashed_password": "password123",
+        "is_active": True,
+        "phone_number": None
+    }
+    response = client.post("/users/", json=user_request)
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+
 def test_get_user(test_user):
     response = client.get(f"/users/{test_user.id}")
     assert response.status_code == status.HTTP_200_OK
@@ -75,6 +100,22 @@ def test_get_user(test_user):
     assert data["is_active"] == test_user.is_active
     assert data["phone_number"] == test_user.phone_number
 
+def test_get_user_conditional_get(test_user):
+    response = client.get(f"/users/{test_user.id}")
+    etag = response.headers["ETag"]
+
+    response = client.get(f"/users/{test_user.id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    db = TestingSessionLocal()
+    db.query(User).filter(User.id == test_user.id).update({"first_name": "changed"})
+    db.commit()
+    db.close()
+    response = client.get(f"/users/{test_user.id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["first_name"] == "changed"
+
 def test_update_user(test_user):
     user_request = {
         "username": "newuser",
@@ -110,6 +151,16 @@ def test_delete_user(test_user):
     db.close()
 
 
+def test_export_users_ndjson(test_user):
+    response = client.get("/users/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["username"] == test_user.username
+    assert "hashed_password" not in lines[0]
+
+
 def test_get_user_not_found(test_user):
     response = client.get(f"/users/999999")
     assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -139,3 +190,30 @@ def test_delete_user_not_found(test_user):
     data = response.json()
     assert data["detail"] == "User not found"
     
+
+
+def test_create_user_idempotency_key_skips_rehash(test_user, monkeypatch):
+    idempotency.clear()
+    user_request = {
+        "username": "retried",
+        "first_name": "test",
+        "last_name": "test",
+        "email": "retried@test.com",
+        "role": "user",
+        "hashed_password": "password123",
+        "is_active": True,
+        "phone_number": None
+    }
+    hashes = []
+    original_hash = password_hasher.hash
+
+    async def counting_hash(password):
+        hashes.append(password)
+        return await original_hash(password)
+
+    monkeypatch.setattr(password_hasher, "hash", counting_hash)
+    first = client.post("/users/", json=user_request, headers={"Idempotency-Key": "signup-1"})
+    retry = client.post("/users/", json=user_request, headers={"Idempotency-Key": "signup-1"})
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry.json()["id"] == first.json()["id"]
+    assert len(hashes) == 1
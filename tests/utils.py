@@ -1,33 +1,69 @@
+import asyncio
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from fastapi_todo_list.database_conn import Base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, NullPool
 from fastapi.testclient import TestClient
 from fastapi_todo_list.main import app
 import pytest
 from fastapi_todo_list.models import User, Todos
+from fastapi_todo_list.routers.todos import todo_cache
+from fastapi_todo_list.query_metrics import instrument_engine
+from fastapi_todo_list.health import health_monitor
+from contextlib import contextmanager
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import event, text
 
 
 SQLITE_DATABASE_URL = "sqlite:///./test.db"
+ASYNC_SQLITE_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 engine = create_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient runs every request on a fresh event loop, so async connections must not be pooled
+async_engine = create_async_engine(ASYNC_SQLITE_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+instrument_engine(async_engine)
+health_monitor.engine = async_engine
 Base.metadata.create_all(bind=engine)
 
 client = TestClient(app)
 
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def override_get_current_user():
+def override_get_session_factory():
+    return TestingAsyncSessionLocal
+
+async def override_get_current_user():
     return {"user_id": 1, "username": "test"}
 
 
+def run_concurrently(*coroutines, return_exceptions: bool = False) -> list:
+    """Run the coroutines as concurrent tasks on one event loop, in order, and return their results."""
+    async def gather():
+        return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+
+    return asyncio.run(gather())
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail when the block runs more than `limit` statements on the test async engine."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "after_cursor_execute", record)
+    assert len(statements) <= limit, f"expected at most {limit} queries, ran {len(statements)}:\n" + "\n".join(statements)
+
+
 @pytest.fixture()
 def test_user():
     db = TestingSessionLocal()
@@ -58,7 +94,9 @@ def test_user():
 def test_todo():
     db = TestingSessionLocal()
     db.execute(text("DELETE FROM todos"))
+    db.execute(text("DELETE FROM todo_deletions"))
     db.commit()
+    todo_cache.backend.clear()
     
     todo = Todos(
         title="Test Todo",
@@ -0,0 +1,170 @@
+"""Delta sync for todos: what changed for an owner since a GET /todos/changes cursor.
+
+Changed todos are read in (changed_at, id) order over ix_todos_owner_id_changed_at, and deletions
+in (deleted_at, id) order from the todo_deletions log, so a sync reads only the rows that changed.
+Both timestamps are stamped by the app when the row is flushed, not when it commits, so a slow
+transaction can commit a timestamp older than ones already synced. The cursor therefore never moves
+past now - TODO_CHANGES_SETTLE_SECONDS: newer rows are returned but sent again by the next sync, and
+clients must apply changes idempotently. The client-supplied updated_at plays no part.
+
+The log keeps TODO_DELETIONS_RETENTION_DAYS of deletions. Older cursors are refused and the client
+resyncs in full. Prune the log, on the main database and every shard, from cron:
+
+    python -m fastapi_todo_list.todo_changes [--days DAYS]
+"""
+import argparse
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, insert, or_, select
+from .models import TodoDeletions, Todos
+from .settings.base import TODO_CHANGES_SETTLE_SECONDS, TODO_DELETIONS_RETENTION_DAYS
+
+
+def encode_cursor(todos_position, deletions_position, synced_at: datetime) -> str:
+    def position(value):
+        return None if value is None else [value[0].isoformat(), value[1]]
+
+    payload = {"todos": position(todos_position), "deletions": position(deletions_position),
+               "synced_at": synced_at.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Raises ValueError for anything encode_cursor did not produce."""
+    def position(value):
+        if value is None:
+            return None
+        changed_at, row_id = value
+        return datetime.fromisoformat(changed_at), int(row_id)
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        decoded = {"todos": position(payload["todos"]), "deletions": position(payload["deletions"]),
+                   "synced_at": datetime.fromisoformat(payload["synced_at"])}
+    except (KeyError, TypeError, json.JSONDecodeError) as exc:
+        raise ValueError("invalid cursor") from exc
+    if decoded["synced_at"].tzinfo is None:
+        raise ValueError("invalid cursor")
+    return decoded
+
+
+def cursor_expired(cursor: dict, now: datetime | None = None) -> bool:
+    now = now or datetime.now(timezone.utc)
+    return cursor["synced_at"] < now - timedelta(days=TODO_DELETIONS_RETENTION_DAYS)
+
+
+def _after(changed_at, row_id, position):
+    if position is None:
+        return ()
+    value, last_id = position
+    return (or_(changed_at > value, and_(changed_at == value, row_id > last_id)),)
+
+
+def _position_columns(changed_at, row_id, horizon):
+    return changed_at.label("position_at"), row_id.label("position_id"), (changed_at <= horizon).label("settled")
+
+
+def _next_position(rows, position, limit: int):
+    # only settled rows move the cursor; the rest of the page is sent again next time
+    settled = [row for row in rows[:limit] if row.settled]
+    if settled:
+        position = (settled[-1].position_at, settled[-1].position_id)
+    return position
+
+
+def _has_more(rows, limit: int) -> bool:
+    # a full page ending in unsettled rows would not move the cursor, so the client waits instead
+    return len(rows) > limit and bool(rows[limit - 1].settled)
+
+
+async def read_changes(db, owner_id: int, cursor: dict | None, limit: int):
+    """Up to `limit` changed todos and deleted ids after `cursor`; without one, every todo."""
+    synced_at = datetime.now(timezone.utc)
+    horizon = synced_at - timedelta(seconds=TODO_CHANGES_SETTLE_SECONDS)
+    todos_position = cursor["todos"] if cursor else None
+    result = await db.execute(
+        select(Todos, *_position_columns(Todos.changed_at, Todos.id, horizon))
+        .where(Todos.owner_id == owner_id, *_after(Todos.changed_at, Todos.id, todos_position))
+        .order_by(Todos.changed_at, Todos.id)
+        .limit(limit + 1)
+    )
+    todo_rows = result.all()
+
+    if cursor is None:
+        # a full sync needs no deletions, only a starting point for the next one; deletions
+        # still committing are at or after the horizon
+        deletion_rows, deletions_position = [], (horizon, 0)
+    else:
+        result = await db.execute(
+            select(TodoDeletions.todo_id, *_position_columns(TodoDeletions.deleted_at, TodoDeletions.id, horizon))
+            .where(
+                TodoDeletions.owner_id == owner_id,
+                *_after(TodoDeletions.deleted_at, TodoDeletions.id, cursor["deletions"]),
+            )
+            .order_by(TodoDeletions.deleted_at, TodoDeletions.id)
+            .limit(limit + 1)
+        )
+        deletion_rows = result.all()
+        deletions_position = _next_position(deletion_rows, cursor["deletions"], limit)
+
+    return {
+        "todos": [row[0] for row in todo_rows[:limit]],
+        "deleted": [row[0] for row in deletion_rows[:limit]],
+        "next_cursor": encode_cursor(_next_position(todo_rows, todos_position, limit), deletions_position, synced_at),
+        "has_more": _has_more(todo_rows, limit) or _has_more(deletion_rows, limit),
+    }
+
+
+async def record_deletions(db, owner_id: int, todo_ids):
+    # in the same transaction as the delete, so a todo never disappears without a trace
+    if todo_ids:
+        await db.execute(insert(TodoDeletions), [{"owner_id": owner_id, "todo_id": todo_id} for todo_id in todo_ids])
+
+
+def prune_statement(days: int = TODO_DELETIONS_RETENTION_DAYS):
+    return delete(TodoDeletions).where(TodoDeletions.deleted_at < datetime.now(timezone.utc) - timedelta(days=days))
+
+
+async def prune_shards(shards, days: int = TODO_DELETIONS_RETENTION_DAYS) -> dict:
+    """Prune the log on every shard; owners' deletions live on their shard once todos are sharded."""
+    pruned = {}
+    for name in shards.urls:
+        async with shards.shard_session_factory(name)() as db:
+            result = await db.execute(prune_statement(days))
+            await db.commit()
+        pruned[name] = result.rowcount
+    return pruned
+
+
+async def _prune_all_shards(days: int):
+    from .sharding import shard_set
+
+    try:
+        for name, count in (await prune_shards(shard_set, days)).items():
+            print(f"pruned {count} deletions on shard {name}")
+    finally:
+        await shard_set.dispose()
+
+
+def main():
+    from .database_conn import SessionLocal
+    from .settings.base import TODO_SHARD_URLS
+
+    parser = argparse.ArgumentParser(description="Delete todo_deletions entries older than the retention period.")
+    parser.add_argument("--days", type=int, default=TODO_DELETIONS_RETENTION_DAYS, help="keep this many days")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        result = db.execute(prune_statement(args.days))
+        db.commit()
+        print(f"pruned {result.rowcount} deletions")
+    finally:
+        db.close()
+    if TODO_SHARD_URLS:
+        asyncio.run(_prune_all_shards(args.days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Per-owner todo counters, maintained in the same transaction as every todo write.
+
+Rebuild the table from the todos themselves, on the main database and every shard, to repair drift:
+
+    python -m fastapi_todo_list.todo_stats [--owner OWNER_ID]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import Todos, TodoStats
+
+
+class TodoStatsDelta:
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [0, 0])
+
+    def add(self, owner_id: int, priority: int, completed: bool | None, step: int = 1):
+        self._deltas[(owner_id, priority)][1 if completed else 0] += step
+
+    def rows(self):
+        return [
+            {"owner_id": owner_id, "priority": priority, "open_count": open_delta, "completed_count": completed_delta}
+            for (owner_id, priority), (open_delta, completed_delta) in self._deltas.items()
+            if open_delta or completed_delta
+        ]
+
+    async def apply(self, db):
+        rows = self.rows()
+        if not rows:
+            return
+        dialect_name = db.bind.dialect.name
+        if dialect_name == "mysql":
+            statement = mysql_insert(TodoStats).values(rows)
+            await db.execute(statement.on_duplicate_key_update(
+                open_count=TodoStats.open_count + statement.inserted.open_count,
+                completed_count=TodoStats.completed_count + statement.inserted.completed_count,
+            ))
+        elif dialect_name == "sqlite":
+            statement = sqlite_insert(TodoStats).values(rows)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=[TodoStats.owner_id, TodoStats.priority],
+                set_={
+                    "open_count": TodoStats.open_count + statement.excluded.open_count,
+                    "completed_count": TodoStats.completed_count + statement.excluded.completed_count,
+                },
+            ))
+        else:
+            for row in rows:
+                result = await db.execute(
+                    update(TodoStats)
+                    .where(TodoStats.owner_id == row["owner_id"], TodoStats.priority == row["priority"])
+                    .values(
+                        open_count=TodoStats.open_count + row["open_count"],
+                        completed_count=TodoStats.completed_count + row["completed_count"],
+                    )
+                )
+                if result.rowcount == 0:
+                    await db.execute(insert(TodoStats).values(**row))
+
+
+async def read_todo_stats(db, owner_id: int):
+    result = await db.execute(
+        select(TodoStats.priority, TodoStats.open_count, TodoStats.completed_count)
+        .where(TodoStats.owner_id == owner_id)
+        .order_by(TodoStats.priority)
+    )
+    by_priority = [
+        {"priority": priority, "open": open_count, "completed": completed_count}
+        for priority, open_count, completed_count in result.all()
+        if open_count or completed_count
+    ]
+    open_total = sum(item["open"] for item in by_priority)
+    completed_total = sum(item["completed"] for item in by_priority)
+    return {"open": open_total, "completed": completed_total, "total": open_total + completed_total, "by_priority": by_priority}
+
+
+def rebuild_statements(owner_id: int | None = None):
+    clear = delete(TodoStats)
+    counts = select(
+        Todos.owner_id,
+        Todos.priority,
+        func.sum(case((Todos.completed.is_(True), 0), else_=1)),
+        func.sum(case((Todos.completed.is_(True), 1), else_=0)),
+    ).group_by(Todos.owner_id, Todos.priority)
+    if owner_id is not None:
+        clear = clear.where(TodoStats.owner_id == owner_id)
+        counts = counts.where(Todos.owner_id == owner_id)
+    fill = insert(TodoStats).from_select(["owner_id", "priority", "open_count", "completed_count"], counts)
+    return clear, fill
+
+
+def rebuild_todo_stats(db, owner_id: int | None = None):
+    for statement in rebuild_statements(owner_id):
+        db.execute(statement)
+    db.commit()
+
+
+async def rebuild_shards(shards, owner_id: int | None = None):
+    """Rebuild on every shard; owners' counters live on their shard once todos are sharded."""
+    for name in shards.urls:
+        async with shards.shard_session_factory(name)() as db:
+            for statement in rebuild_statements(owner_id):
+                await db.execute(statement)
+            await db.commit()
+
+
+async def _rebuild_all_shards(owner_id: int | None):
+    from .sharding import shard_set
+
+    try:
+        await rebuild_shards(shard_set, owner_id)
+    finally:
+        await shard_set.dispose()
+
+
+def main():
+    from .database_conn import SessionLocal
+    from .settings.base import TODO_SHARD_URLS
+
+    parser = argparse.ArgumentParser(description="Rebuild the todo_stats counters from the todos table.")
+    parser.add_argument("--owner", type=int, default=None, help="only rebuild this owner's counters")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        rebuild_todo_stats(db, args.owner)
+    finally:
+        db.close()
+    if TODO_SHARD_URLS:
+        asyncio.run(_rebuild_all_shards(args.owner))
+
+
+if __name__ == "__main__":
+    main()